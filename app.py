@@ -1,23 +1,24 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, jsonify, render_template, request
 from flask_cors import CORS
-from datetime import datetime, timedelta
-import pytz
-import csv
-from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+import json
+import time
+
+import hijri_lookup
+from hijri_time import mecca_ordinal
+from moon_phase_store import PHASES, eclipse_names
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables to store our data
-moon_phase_data = defaultdict(list)
-hijri_data = {}
-
 # Constants
-DATEFORMAT = "%Y-%m-%d %H:%M:%S"
-HIRJI_START_YEAR = 622
-MECCA_TIMEZONE = pytz.timezone('Asia/Riyadh')
-SOLARYEAR_DAYS = 365.24219
-MUHARRAM_YEARS = [3, 6, 8, 11, 14, 17, 19]
+# Months of /api/month kept in memory, and how long clients may keep them (they only change with the data)
+MONTH_CACHE_SIZE = 2048
+MONTH_CACHE_CONTROL = 'public, max-age=86400'
+
+# Most dates converted by one request to /api/convert
+MAX_CONVERT_DATES = 100000
 
 HIJRI_MONTHS = {
     1: "Safar I", 2: "Safar II", 3: "Rabi I", 4: "Rabi II", 
@@ -26,72 +27,40 @@ HIJRI_MONTHS = {
     13: "Muharram", 0: "Muharram"
 }
 
-HIJRI_MONTHS_DAYCOUNT = {i: 30 if i % 2 == 1 else 29 for i in range(1, 13)}
-HIJRI_MONTHS_DAYCOUNT[13] = 30
-HIJRI_MONTHS_DAYCOUNT[0] = 30
+# Hijri dates and moon phases, memory-mapped from the lookup table (see hijri_lookup.py)
+lookup = None
 
-KABS_MONTH = 12
-KABS_MONTHS = [8, 12]
-
-def load_csv_data(filename):
-    with open(filename, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            date = datetime.strptime(row['datetime'], '%Y-%m-%d %H:%M:%S')
-            moon_phase_data[date.date()].append({
-                'phase': row['phase'],
-                'eclipse': row['eclipse'] if row['eclipse'] else None
-            })
-
-# Load the CSV data when the app starts
-load_csv_data('Moon phases CSV files/moon-phases-601-to-2100-UT.csv.csv')
+def load_hijri_dates():
+    """Loads the lookup table, it is only computed when missing or out of date"""
+    global lookup
+    lookup = hijri_lookup.open_lookup()
 
 def calculate_hijri_dates():
-    entries = sorted(moon_phase_data.items())
-    hijri_year = 1
-    lunar_days = 0
-    month_count = 0
-    is_muharram = False
-
-    for i in range(len(entries) - 1):
-        gregorian_start_month, phases = entries[i]
-        gregorian_end_month, _ = entries[i + 1]
+    """Computes the lookup table from the moon phase CSV file again and loads it"""
+    global lookup
+    lookup = hijri_lookup.load_lookup()
+    get_month_payload.cache_clear()
 
-        if gregorian_start_month.year < HIRJI_START_YEAR:
-            continue
+# Load the lookup table when the app starts
+load_hijri_dates()
 
-        month_count += 1
-        start_month = gregorian_start_month + timedelta(days=1)
-        end_month = start_month + timedelta(days=HIJRI_MONTHS_DAYCOUNT[month_count])
-
-        days_off = (gregorian_end_month - end_month).days
-
-        if days_off >= 1 and not is_muharram and month_count == KABS_MONTH:
-            end_month += timedelta(days=1)
-            HIJRI_MONTHS_DAYCOUNT[month_count] = 30
-        elif month_count in KABS_MONTHS:
-            HIJRI_MONTHS_DAYCOUNT[month_count] = 29
-
-        lunar_days += HIJRI_MONTHS_DAYCOUNT[month_count]
+def get_hijri_date(gregorian_date):
+    hijri_date = lookup.hijri_date(gregorian_date.toordinal())
+    if hijri_date is None:
+        return None
 
-        for day in range(HIJRI_MONTHS_DAYCOUNT[month_count]):
-            date = start_month + timedelta(days=day)
-            hijri_data[date] = {
-                'year': hijri_year,
-                'month': month_count,
-                'day': day + 1
-            }
+    year, month, day = hijri_date
+    return {'year': year, 'month': month, 'day': day}
 
-        if (month_count == 12 and not is_muharram) or month_count == 13:
-            hijri_year += 1
-            lunar_days = 0
-            month_count = 0
-            is_muharram = hijri_year % 19 in MUHARRAM_YEARS
+def get_gregorian_date(year, month, day):
+    ordinal = lookup.gregorian_ordinal(year, month, day)
+    return None if ordinal is None else date.fromordinal(ordinal)
 
-calculate_hijri_dates()
-
-def get_hijri_date(gregorian_date):
-    return hijri_data.get(gregorian_date.date(), None)
+def get_moon_phases(gregorian_date):
+    return [{
+        'phase': PHASES[phase],
+        'eclipse': eclipse_names(eclipse)[0] if eclipse else None
+    } for phase, eclipse in lookup.moon_phases(gregorian_date.toordinal())]
 
 @app.route('/')
 def index():
@@ -99,35 +68,111 @@ def index():
 
 @app.route('/api/today')
 def get_today():
-    today = datetime.now(MECCA_TIMEZONE).date()
+    today = date.fromordinal(mecca_ordinal(int(time.time()) // 60))
     hijri_date = get_hijri_date(today)
-    phases = moon_phase_data.get(today, [])
+    phases = get_moon_phases(today)
     return jsonify({
-        "gregorian": today.strftime("%Y-%m-%d"),
+        "gregorian": today.isoformat(),
         "hijri": hijri_date,
         "moon_phases": phases
     })
 
-@app.route('/api/month/<int:year>/<int:month>')
-def get_month(year, month):
-    start_date = datetime(year, month, 1, tzinfo=MECCA_TIMEZONE).date()
+def convert_dates(items):
+    """Converts Gregorian ("YYYY-MM-DD" or {"gregorian": "YYYY-MM-DD"}) and Hijri
+    ({"hijri": {"year": ..., "month": ..., "day": ...}}) dates, all of them in one lookup each way"""
+    results = [None] * len(items)
+    gregorian = []  # (position, ordinal)
+    hijri = []      # (position, (year, month, day))
+
+    for position, item in enumerate(items):
+        try:
+            if isinstance(item, dict) and 'hijri' in item:
+                hijri_date = item['hijri']
+                hijri.append((position, (int(hijri_date['year']), int(hijri_date['month']), int(hijri_date['day']))))
+            else:
+                text = item['gregorian'] if isinstance(item, dict) else item
+                gregorian.append((position, date.fromisoformat(text).toordinal()))
+        except (KeyError, OverflowError, TypeError, ValueError):
+            results[position] = {"error": f"Not a Gregorian or Hijri date: {json.dumps(item)}"}
+
+    for (position, ordinal), hijri_date in zip(gregorian, lookup.hijri_dates([ordinal for _, ordinal in gregorian])):
+        results[position] = {
+            "gregorian": date.fromordinal(ordinal).isoformat(),
+            "hijri": None if hijri_date is None else dict(zip(('year', 'month', 'day'), hijri_date))
+        }
+
+    for (position, hijri_date), ordinal in zip(hijri, lookup.gregorian_ordinals([hijri_date for _, hijri_date in hijri])):
+        results[position] = {
+            "gregorian": None if ordinal is None else date.fromordinal(ordinal).isoformat(),
+            "hijri": dict(zip(('year', 'month', 'day'), hijri_date))
+        }
+
+    return results
+
+@lru_cache(maxsize=MONTH_CACHE_SIZE)
+def get_month_payload(version, year, month):
+    """JSON body of /api/month, the version of the lookup table is part of the key"""
+    start_date = date(year, month, 1)
     if month == 12:
-        end_date = datetime(year + 1, 1, 1, tzinfo=MECCA_TIMEZONE).date() - timedelta(days=1)
+        end_date = date(year + 1, 1, 1) - timedelta(days=1)
     else:
-        end_date = datetime(year, month + 1, 1, tzinfo=MECCA_TIMEZONE).date() - timedelta(days=1)
+        end_date = date(year, month + 1, 1) - timedelta(days=1)
     
     month_data = []
     current_date = start_date
     while current_date <= end_date:
         hijri_date = get_hijri_date(current_date)
-        phases = moon_phase_data.get(current_date, [])
+        phases = get_moon_phases(current_date)
         month_data.append({
-            "gregorian": current_date.strftime("%Y-%m-%d"),
+            "gregorian": current_date.isoformat(),
             "hijri": hijri_date,
             "moon_phases": phases
         })
         current_date += timedelta(days=1)
-    return jsonify(month_data)
+    return jsonify(month_data).get_data()
+
+@app.route('/api/hijri/<int:year>/<int:month>/<int:day>')
+def get_hijri(year, month, day):
+    gregorian_date = get_gregorian_date(year, month, day)
+    if gregorian_date is None:
+        return jsonify({"error": f"{year}/{month}/{day} is not a date of the Hijri calendar"}), 404
+
+    return jsonify({
+        "gregorian": gregorian_date.isoformat(),
+        "hijri": {'year': year, 'month': month, 'day': day, 'month_name': HIJRI_MONTHS[month]},
+        "moon_phases": get_moon_phases(gregorian_date)
+    })
+
+@app.route('/api/month/<int:year>/<int:month>')
+def get_month(year, month):
+    response = Response(get_month_payload(lookup.version, year, month), mimetype='application/json')
+    response.set_etag(f"{lookup.version}-{year}-{month}")
+    response.headers['Cache-Control'] = MONTH_CACHE_CONTROL
+    return response.make_conditional(request)
+
+@app.route('/api/convert', methods=['POST'])
+def convert():
+    """Converts a JSON list, or NDJSON lines (Content-Type: application/x-ndjson), of dates in input order"""
+    ndjson = request.mimetype == 'application/x-ndjson'
+
+    try:
+        if ndjson:
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            items = json.loads(request.get_data(as_text=True))
+    except ValueError:
+        return jsonify({"error": "The body is not valid JSON"}), 400
+
+    if not isinstance(items, list):
+        return jsonify({"error": "Expected a list of dates"}), 400
+    if len(items) > MAX_CONVERT_DATES:
+        return jsonify({"error": f"At most {MAX_CONVERT_DATES} dates per request"}), 413
+
+    results = convert_dates(items)
+
+    if ndjson:
+        return Response(''.join(json.dumps(result) + '\n' for result in results), mimetype='application/x-ndjson')
+    return jsonify(results)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,226 @@
+'''
+Benchmarks of the moon phase parsing, the calendar variants and the web app.
+
+Every benchmark runs on a range of years of the moon phase table, from a couple of years up to the
+whole table (see RANGES). A range that the table does not cover is recorded as skipped.
+
+	parse_file					hijri_calendar_naive_metonic.parse_file (full moons only)
+	parse_file_with_eclipses	hijri_calendar_naive_metonic.parse_file_with_eclipses
+	compute:<variant>			hijri_calendar_engine.compute_calendars for one variant, nothing printed
+	calculate_hijri_dates		app.calculate_hijri_dates (builds the lookup table of the whole table)
+	api_today					GET /api/today through the Flask test client
+	api_month					GET /api/month/<year>/<month> for the last API_MONTHS months of the range, cache cleared first
+	api_month_cached			The same requests again, answered from the cache
+
+The results are written as JSON (see write_results) so that two runs, e.g. of two commits, can be compared:
+
+	python benchmark.py --output before.json
+	git checkout <other commit>
+	python benchmark.py --output after.json --compare before.json
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import moon_phase_store
+from hijri_calendar_engine import VARIANTS, compute_calendars
+
+
+'''	--------- CONSTANTS ------------ '''
+
+# Ranges of years, from the smallest to the largest table the scripts have been run on
+RANGES = [(2023, 2024), (2024, 2055), (1900, 2100), (601, 2100)]
+
+REPEAT = 3
+
+# Months requested from /api/month per range (the last ones of the range), the test client dominates beyond that
+API_MONTHS = 120
+
+VERSION = 1
+
+
+'''	--------- UTILITIES ------------ '''
+def measure(function, repeat = REPEAT):
+	""" Calls the function 'repeat' times with its output discarded, returns the times (seconds) and its last result """
+	times = []
+
+	for _ in range(repeat):
+		with contextlib.redirect_stdout(io.StringIO()):
+			start = time.perf_counter()
+			result = function()
+			times.append(time.perf_counter() - start)
+
+	return times, result
+
+def result(name, years, times, rows = None):
+	""" One benchmark result: the best and mean time, and the rows per second of the best time """
+	record = {"name": name, "years": f"{years[0]}-{years[1]}", "repeat": len(times),
+			"best": min(times), "mean": sum(times) / len(times)}
+
+	if rows is not None:
+		record["rows"] = rows
+		record["rows_per_second"] = rows / min(times) if min(times) else None
+
+	return record
+
+def git_commit():
+	""" Returns the commit of the working tree, None outside a git repository """
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], capture_output = True, text = True, check = True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+'''	-------- BENCHMARKS ------------ '''
+def benchmark_parsing(start_year, end_year, repeat):
+	""" Times parse_file and parse_file_with_eclipses of the calendar scripts on the range """
+	with contextlib.redirect_stdout(io.StringIO()):
+		import hijri_calendar_naive_metonic as calendar		# Prints on import
+
+	results = []
+	for parse in (calendar.parse_file, calendar.parse_file_with_eclipses):
+		times, full_moons = measure(lambda: parse(start_year, end_year), repeat)
+		results.append(result(parse.__name__, (start_year, end_year), times, len(full_moons)))
+
+	return results
+
+def benchmark_variants(start_year, end_year, repeat):
+	""" Times the computation of each calendar variant on the full moons of the range """
+	filename = moon_phase_store.dataset_filename(start_year, end_year)
+	full_moons = moon_phase_store.load_full_moons(filename, merge_eclipses = True, start_year = start_year, end_year = end_year)
+
+	results = []
+	for variant in VARIANTS:
+		times, calendars = measure(lambda: compute_calendars(full_moons, end_year, [variant]), repeat)
+		results.append(result(f"compute:{variant}", (start_year, end_year), times, len(calendars[variant])))
+
+	return results
+
+def benchmark_app(start_year, end_year, repeat):
+	""" Times the handlers of the web app through the Flask test client, the lookup table once """
+	with contextlib.redirect_stdout(io.StringIO()):
+		import app
+
+	client = app.app.test_client()
+	months = [(year, month) for year in range(start_year, end_year + 1) for month in range(1, 13)][-API_MONTHS:]
+
+	def get_months():
+		for year, month in months:
+			client.get(f"/api/month/{year}/{month}")
+
+	def get_months_uncached():
+		app.get_month_payload.cache_clear()
+		get_months()
+
+	results = []
+
+	times, _ = measure(lambda: client.get("/api/today"), repeat)
+	results.append(result("api_today", (start_year, end_year), times))
+
+	times, _ = measure(get_months_uncached, repeat)
+	results.append(result("api_month", (start_year, end_year), times, len(months)))
+
+	times, _ = measure(get_months, repeat)
+	results.append(result("api_month_cached", (start_year, end_year), times, len(months)))
+
+	return results
+
+def benchmark_lookup(repeat):
+	""" Times app.calculate_hijri_dates, which computes the lookup table of the whole moon phase table """
+	with contextlib.redirect_stdout(io.StringIO()):
+		import app
+
+	dataset = moon_phase_store.DATASET
+	times, _ = measure(app.calculate_hijri_dates, repeat)
+	return [result("calculate_hijri_dates", (dataset["start_year"], dataset["end_year"]), times, len(app.lookup.days))]
+
+
+'''	-------- RESULTS ------------ '''
+def write_results(results, filename):
+	""" Writes the results with the commit, Python version and platform they were measured on """
+	report = {
+		"version": VERSION,
+		"commit": git_commit(),
+		"created": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"binary_store": moon_phase_store.open_store(moon_phase_store.DATASET["filename"]) is not None,
+		"results": results,
+		}
+
+	with open(filename, "w") as file:
+		json.dump(report, file, indent = 1)
+
+def compare_results(results, filename):
+	""" Prints the best time of each result next to the same result in an earlier report """
+	with open(filename) as file:
+		earlier = {(record["name"], record["years"]): record for record in json.load(file)["results"]}
+
+	print(f"\n{'benchmark':<36}{'years':>12}{'before (s)':>14}{'after (s)':>14}{'speedup':>10}")
+
+	for record in results:
+		before = earlier.get((record["name"], record["years"]))
+
+		if "best" not in record or before is None or "best" not in before:
+			continue
+
+		speedup = before["best"] / record["best"] if record["best"] else float("inf")
+		print(f"{record['name']:<36}{record['years']:>12}{before['best']:>14.4f}{record['best']:>14.4f}{speedup:>9.2f}x")
+
+
+'''	----------- MAIN -------------- '''
+def main():
+
+	parser = argparse.ArgumentParser(description = "Benchmarks parsing, the calendar variants and the web app")
+	parser.add_argument("--repeat", type = int, default = REPEAT, help = "runs of each benchmark, the best is reported")
+	parser.add_argument("--output", default = "benchmark_results.json", help = "JSON file of the results")
+	parser.add_argument("--compare", metavar = "JSON", help = "results of an earlier run to compare with")
+	parser.add_argument("--no-app", action = "store_true", help = "skip the benchmarks of the web app")
+	args = parser.parse_args()
+
+	results = []
+
+	for start_year, end_year in RANGES:
+		try:
+			moon_phase_store.dataset_filename(start_year, end_year)
+		except FileNotFoundError as error:
+			results.append({"name": "*", "years": f"{start_year}-{end_year}", "skipped": str(error)})
+			print(f"{start_year}-{end_year}: skipped, {error}", file = sys.stderr)
+			continue
+
+		results += benchmark_parsing(start_year, end_year, args.repeat)
+		results += benchmark_variants(start_year, end_year, args.repeat)
+
+		if not args.no_app:
+			results += benchmark_app(start_year, end_year, args.repeat)
+
+		print(f"{start_year}-{end_year}: done", file = sys.stderr)
+
+	if not args.no_app:
+		results += benchmark_lookup(args.repeat)
+
+	write_results(results, args.output)
+
+	for record in results:
+		if "best" in record:
+			rate = f"{record['rows_per_second']:>12.0f} rows/s" if record.get("rows_per_second") else ""
+			print(f"{record['name']:<36}{record['years']:>12}{record['best']:>10.4f} s {rate}")
+
+	if args.compare and os.path.exists(args.compare):
+		compare_results(results, args.compare)
+
+	print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+	main()
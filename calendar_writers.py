@@ -0,0 +1,243 @@
+'''
+Output writers for computed Hijri months (the HijriMonth records of hijri_calendar_engine.py).
+
+Printing a few lines per month through print() makes the terminal I/O the slowest part of a run.
+These writers format the months into large chunks and write them through one buffered file:
+
+	text		The human-readable layout of the calendar scripts (see write_text)
+	csv			One row per month with ISO dates
+	jsonl		One JSON object per month (JSON Lines)
+	binary		Fixed size little-endian rows (see ROW), read back with read_binary
+	quiet		Writes nothing, skips all formatting
+
+Example:
+	calendars = compute_calendars(full_moons, end_year = 2100, variants = ["aware"])
+	write_months(calendars["aware"], "csv", "aware", "aware.csv")
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import csv
+import json
+import struct
+import sys
+from functools import lru_cache
+
+from hijri_calendar_engine import HIJRI_MONTHS, HijriMonth, is_january_end
+from hijri_time import civil_from_ordinal, format_date
+from moon_phase_store import eclipse_text
+from stage_profile import argument_rows, profiled
+
+
+'''	--------- CONSTANTS ------------ '''
+
+BUFFER_SIZE = 1 << 20	# bytes
+
+CHUNK_SIZE = 1024		# months formatted before each write
+
+FIELDS = list(HijriMonth._fields)
+
+DATE_FIELDS = ["gregorian_start", "gregorian_end", "start", "end"]
+
+# Month names as the calendar scripts print them
+TEXT_MONTHS = {**HIJRI_MONTHS, 3: "Rabi I\t", 7: "Rajab\t"}
+
+YEAR_HEADER = "\n------------------------------- THE YEAR IS {} ------------------------------\n\n"
+
+MAGIC = b"HJRM"
+
+VERSION = 1
+
+# magic, version, flags, number of rows
+HEADER = struct.Struct("<4sHHQ")
+
+# gregorian_start, gregorian_end, start, end, year, length, month, leap_year, days_off, eclipse bitmask
+ROW = struct.Struct("<iiiiibbBdB")
+
+
+'''	--------- UTILITIES ------------ '''
+@lru_cache(maxsize = None)
+def iso_date(ordinal):
+	""" Formats an ordinal as YYYY-MM-DD """
+	year, month, day = civil_from_ordinal(ordinal)
+	return f"{year:04d}-{month:02d}-{day:02d}"
+
+def open_output(filename, output_format):
+	""" Opens the output file with a large buffer """
+	if output_format == "binary":
+		return open(filename, "wb", buffering = BUFFER_SIZE)
+	return open(filename, "w", buffering = BUFFER_SIZE, newline = "", encoding = "utf-8")
+
+def write_chunks(lines, file):
+	""" Writes an iterable of strings in chunks of CHUNK_SIZE """
+	chunk = []
+	for line in lines:
+		chunk.append(line)
+		if len(chunk) == CHUNK_SIZE:
+			file.write("".join(chunk))
+			chunk = []
+	file.write("".join(chunk))
+
+
+'''	-------- WRITERS ------------ '''
+def write_text(months, file, variant = "aware"):
+	""" Writes the months in the layout printed by hijri_calendar_<variant>.py """
+
+	date = lru_cache(maxsize = None)(format_date)
+	fixed = variant in ("aware", "naive", "naive_metonic")
+	gregorian_header = variant in ("aware", "naive")
+
+	def format_year(previous, month, year_months):
+		""" The lines printed between the last month of a year and the first month of the next """
+		lines = []
+
+		if variant == "aware_simple":
+			lengths = [m.length for m in year_months]
+			lines.append(f"Number of months with 29 days: {lengths.count(29)}, Number of months with 30 days: {lengths.count(30)}\n")
+
+		lines.append(YEAR_HEADER.format(civil_from_ordinal(previous.end + fixed)[0] if gregorian_header else previous.year + 1))
+
+		if variant in ("aware", "aware_simple"):
+			position = 1 if month.month == 0 else 13 if month.leap_year else -1
+			lines.append(f"Muharram position: {position}\n\n")
+		elif variant in ("naive_metonic", "naive_simple_metonic"):
+			lines.append(f"Is Leap Year: {month.leap_year}\n\n")
+
+		return "".join(lines)
+
+	def format_month(month):
+		name = TEXT_MONTHS[month.month]
+		natural = f"{name} 1, {month.year} - {name} {month.length}, {month.year}\n"
+
+		if variant == "naive":
+			return (f"Full Moon Observed: {date(month.gregorian_start)} - {date(month.gregorian_end)}\n"
+					+ f"Hijri (Gregorian) \t{date(month.start)} - {date(month.end + 1)}\n"
+					+ f"Hijri (Natural): \t{natural}\n")
+
+		if fixed:
+			return (f"{name} {month.length} \t\t\t\t\t\t\t\t\t\t\t\t\t\t{eclipse_text(month.eclipse)}\n"
+					+ f"\tFull Moon Observed: {date(month.gregorian_start)} - {date(month.gregorian_end - 1)}\n"
+					+ f"\tHijri (Gregorian) \t{date(month.start)} - {date(month.end)}\n"
+					+ f"\tHijri (Natural): \t{natural}"
+					+ (f"\t\t\t\t\t\tDays off: {month.days_off}\n" if variant == "naive_metonic" else "")
+					+ "\n")
+
+		return (f"{name} {month.length}\n"
+				+ f"\tFull Moon Observed: {date(month.gregorian_start)} - {date(month.gregorian_end)}\n"
+				+ f"\tHijri (Gregorian) \t{date(month.start)} - {date(month.end)}\n"
+				+ f"\tHijri (Natural): \t{natural}\n")
+
+	def lines():
+		previous = None
+		year_months = []
+
+		for month in months:
+			if previous is not None and month.year != previous.year:
+				yield format_year(previous, month, year_months)
+				year_months = []
+
+			yield format_month(month)
+			year_months.append(month)
+			previous = month
+
+		# hijri_calendar_naive.py prints the header of the last year before it stops
+		if variant == "naive" and previous is not None and is_january_end(previous.start, previous.end + 1):
+			yield YEAR_HEADER.format(civil_from_ordinal(previous.end + 1)[0])
+
+	write_chunks(lines(), file)
+
+
+def write_csv(months, file, variant = None):
+	""" Writes one row per month, days as ISO dates """
+	writer = csv.writer(file)
+	writer.writerow(FIELDS)
+
+	chunk = []
+	for month in months:
+		chunk.append([iso_date(day) for day in month[:4]] + list(month[4:-1]) + [eclipse_text(month.eclipse)])
+		if len(chunk) == CHUNK_SIZE:
+			writer.writerows(chunk)
+			chunk = []
+	writer.writerows(chunk)
+
+
+def write_jsonl(months, file, variant = None):
+	""" Writes one JSON object per month, days as ISO dates """
+	dumps = json.JSONEncoder(separators = (",", ":")).encode
+
+	def lines():
+		for month in months:
+			record = month._asdict()
+			for field in DATE_FIELDS:
+				record[field] = iso_date(record[field])
+			record["eclipse"] = eclipse_text(record["eclipse"])
+			yield dumps(record) + "\n"
+
+	write_chunks(lines(), file)
+
+
+def write_binary(months, file, variant = None):
+	""" Writes a header and one ROW per month """
+	rows = bytearray()
+
+	count = 0
+	for month in months:
+		rows += ROW.pack(*month[:4], month.year, month.length, month.month, month.leap_year,
+				month.days_off, month.eclipse)
+		count += 1
+
+	file.write(HEADER.pack(MAGIC, VERSION, 0, count))
+	file.write(rows)
+
+
+def write_quiet(months, file = None, variant = None):
+	""" Consumes the months without formatting anything """
+	for _ in months:
+		pass
+
+
+WRITERS = {
+		"text": write_text,
+		"csv": write_csv,
+		"jsonl": write_jsonl,
+		"binary": write_binary,
+		"quiet": write_quiet,
+		}
+
+EXTENSIONS = {"text": "txt", "csv": "csv", "jsonl": "jsonl", "binary": "bin"}
+
+
+@profiled("output", rows = argument_rows)
+def write_months(months, output_format, variant, filename = None):
+	""" Writes the months with the writer of the format to the file, or to standard output if there is none """
+	writer = WRITERS[output_format]
+
+	if output_format == "quiet":
+		return writer(months)
+
+	if filename is None:
+		file = sys.stdout.buffer if output_format == "binary" else sys.stdout
+		writer(months, file, variant)
+		return file.flush()
+
+	with open_output(filename, output_format) as file:
+		writer(months, file, variant)
+
+
+def read_binary(filename):
+	""" Reads the months written by write_binary back as HijriMonth records """
+	with open(filename, "rb") as file:
+		data = file.read()
+
+	magic, version, _, count = HEADER.unpack_from(data)
+
+	if magic != MAGIC or version != VERSION:
+		raise ValueError(f"{filename} is not a version {VERSION} Hijri month table")
+
+	months = []
+	for gregorian_start, gregorian_end, start, end, year, length, month, leap_year, days_off, eclipse \
+			in ROW.iter_unpack(data[HEADER.size: HEADER.size + count * ROW.size]):
+		months.append(HijriMonth(gregorian_start, gregorian_end, start, end, length, year, month, days_off,
+				bool(leap_year), eclipse))
+
+	return months
@@ -0,0 +1,15 @@
+'''
+Shared pytest setup: the moon phase tables are found relative to the root of the repository.
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import os
+
+import pytest
+
+
+'''	--------- FIXTURES ------------ '''
+@pytest.fixture(autouse = True)
+def repository_root(monkeypatch):
+	monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -17,13 +17,15 @@
     2. 10 days were removed, 4 October 4, 1582 led to October 15, 1582
     3. After October 15, 1582 the Gregorian calendar was used.
 
-    I believe the issues have been circumvented. I've used the convertdate package
-    to convert Julian to Gregorian so as to be able to manipulate datetime objects and
-    so that the dates are consistent. 
+    I believe the issues have been circumvented. The Julian dates are converted to
+    Gregorian so that the dates are consistent (see phase_table.py, which parses the
+    table straight into integer timestamps).
 
     The julian calendar must be converted to Gregorian before use.
 
-    Code takes approxiamately 7.7 seconds to run on my PC.
+    Code takes approxiamately 7.7 seconds to run on my PC fetching one page at a time. The
+    pages are now fetched several at a time and kept in a cache (see page_fetcher.py), use
+    --offline to rebuild the csv file from the cache alone.
 """
 
 # ----------- Choose start year and end year (Gregorian) of the data to be read --------
@@ -33,56 +35,20 @@ END_YEAR = 2100         # AD
 
 
 """------------------ PACKAGES -------------------"""
-from bs4 import BeautifulSoup
-from io import StringIO
-from datetime import datetime, timedelta
-from convertdate import julian, gregorian
+import argparse
 import csv
-import pytz
-import requests
 import sys
 import time
 
+import page_fetcher
+import phase_table
+import scrape_checkpoint
+
 print("Packages imported successfully")
 
 
 """------------------ CONSTANTS -------------------"""
 
-DATE_FORMAT = '%b %d %H:%M' 
-
-ECLIPSE_TAGS = {
-    "T": "Total Solar",
-    "A": "Annular Solar",
-    "H": "Hybrid (Annular/Total) Solar",
-    "P": "Partial Solar",
-    "t": "Total (Umbral) Lunar",
-    "p": "Partial (Umbral) Lunar",
-    "n": "Penumbral Lunar"
-}
-
-HEADER = ['Year', 'New Moon', 'First Quarter', 'Full Moon', 'Last Quarter']
-
-MONTH_ABB = {
-    "Jan": 1,
-    "Feb": 2,
-    "Mar": 3,
-    "Apr": 4,
-    "May": 5,
-    "Jun": 6,
-    "Jul": 7,
-    "Aug": 8,
-    "Sep": 9,
-    "Oct": 10,
-    "Nov": 11,
-    "Dec": 12 }
-
-PHASE_HEADERS = {
-    0: "New Moon", 
-    1: "First Quarter", 
-    2: "Full Moon", 
-    3: "Last Quarter" }
-
-
 # This is to act as though a user is accessing the website
 REQUEST_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
@@ -91,29 +57,13 @@ REQUEST_HEADERS = {
 
 """------------------ FUNCTIONS-------------------"""
 
-def get_page_content(url):
+def get_page_content(text):
     """
-        Scrapes data from a page on the wesbite 'astropixels.com'
-        Returns a list of rows read from the table 'Phases of the Moon'
+        Reads a page of the wesbite 'astropixels.com' (see page_fetcher.py)
+        Returns the moon phases of the table 'Phases of the Moon' as (minutes, phase id,
+        eclipse bitmask), see phase_table.py
     """
-    # Send a GET request to the webpage
-    page = requests.get(url, headers=REQUEST_HEADERS)
-
-    soup = BeautifulSoup(page.text, "html.parser")
-
-    data = soup.find_all('pre') 
-
-    # Remove first and last element
-    data.pop(0); data.pop(-1)
-
-    rows = []
-    for entry in data:
-        # Use StringIO to treat the string as a file
-        csv_file = StringIO(entry.text)
-
-        # Read the data using csv.reader
-        reader = csv.reader(csv_file)
-        rows += list(reader)
+    rows = phase_table.parse_page(text)
 
     print("Data scraped successfully")
     return rows
@@ -121,118 +71,72 @@ def get_page_content(url):
 
 def write_to_csv(rows, filename):
     """
-        Takes in a list of rows scraped from the table on the website, parses it and writes
-        it to a csv file.
+        Takes in the moon phases parsed from the table on the website and appends them to
+        the csv file.
     """
 
-    parsed_data = []    # A list of dicitonaries for the moon phases
-    year = 0            # The year the data belongs to
-
-    for row in rows:
-        # Ensure the row isn't empty
-        if row != []:
-
-            items = row[0].split("   ")
-            new_items = []
-            contains_year = False
-            
-            for i in items:
-                # Ensure the string isn't empty
-                if i.strip():   
-                    i = i.strip()
-
-                    if i.isdigit():           # If it's a number then it's the year (do not add it to list)
-                        year = int(i)
-                        contains_year = True
-                        continue
-
-                    new_items.append(i)
-
-            if new_items == HEADER: # Ignore headers
-                continue
-
-            length = len(new_items)
-            moon_phase = 0
-
-            if contains_year:
-                # This depends at which position it appears in the table
-                moon_phase = 4 - length   
-                contains_year = False 
-            
-            for i in range(length):
-                
-                dictionary = {}
-
-                # Parse the date
-                date_list = new_items[i].split()
-                month = MONTH_ABB[date_list[0]]
-                day = int(date_list[1])
-                hour, minute = date_list[2].split(":")
-                hour = int(hour)
-                minute = int(minute)
-
-
-                # Julian calendar is used before Oct 15, 1582
-                if year < 1582 or (year == 1582 and month < 10) or (year==1582 and month==10 and day<15):
-                    
-                    # print(f"Date {new_items[i]}, {year} is Julian")
-                    julian_date = (year, month, day)
-                    time = timedelta(hours=hour, minutes=minute)  # Time component
-
-                    gregorian_date = julian.to_gregorian(*julian_date)
-                    date = datetime(gregorian_date[0], gregorian_date[1], gregorian_date[2], tzinfo=pytz.utc) + time
-                
-                else:
-                    # print(f"Date {new_items[i]}, {year} is Gregorian")
-                    date = datetime(year, month, day, hour, minute, tzinfo=pytz.utc)
-
-                # Add to dictionary
-                dictionary["datetime"] = date.strftime('%Y-%m-%d %H:%M:%S')
-                dictionary["phase"] = PHASE_HEADERS[moon_phase]
-                dictionary["friendlydate"] = date.strftime("%B %d, %Y")
-                dictionary["eclipse"] = None
-
-                if len(date_list) == 4:     # Look for eclipse tag
-                    dictionary["eclipse"] = ECLIPSE_TAGS[date_list[3]]
-                
-
-                parsed_data.append(dictionary)
-                moon_phase += 1
-
-
     # Append to csv file
     with open(filename, mode='a', newline='', encoding='utf-8') as file:
-        # Create a DictWriter object
-        writer = csv.DictWriter(file, fieldnames = parsed_data[0].keys())
+        writer = csv.writer(file)
 
         # Write the data
-        writer.writerows(parsed_data)
+        writer.writerows(phase_table.format_rows(rows, eclipses=True))
 
     print(f"Data written successfully\n")
     return
 
 
 """--------------------- MAIN --------------------"""
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Scrapes the moon phase tables of AstroPixels into a csv file")
+    parser.add_argument("--start-year", type=int, default=START_YEAR)
+    parser.add_argument("--end-year", type=int, default=END_YEAR)
+    parser.add_argument("--merge", metavar="CSV_FILE",
+                        help="an existing dataset, the pages it covers are taken from it instead of scraped")
+    parser.add_argument("--restart", action="store_true",
+                        help="start over instead of resuming from the last completed page")
+    page_fetcher.add_arguments(parser)
+    return parser.parse_args()
+
+
 def main():
 
-    filename = f'moon-phases-{START_YEAR}-to-{END_YEAR}-with-eclipses-UT.csv'
+    args = parse_arguments()
+    start_year, end_year = args.start_year, args.end_year
+
+    filename = f'moon-phases-{start_year}-to-{end_year}-with-eclipses-UT.csv'
 
     # Get pages that need to be scraped
-    pages = [str(number).zfill(4) for number in range(START_YEAR, END_YEAR + 1, 100)]
+    pages = [str(number).zfill(4) for number in range(start_year, end_year + 1, 100)]
 
-    # Write header of file
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        file.write("datetime,phase,friendlydate,eclipse\n")
+    # Pages covered by the dataset that is extended are not scraped again
+    existing = scrape_checkpoint.read_dataset(args.merge) if args.merge else None
+    merged_pages = scrape_checkpoint.covered_pages(pages, existing[1]) if existing else []
 
-    for page in pages:
-        print(f"\nCompiling date for the year: {page}")
+    # Write header of file, or resume after the last page that was written completely
+    checkpoint = scrape_checkpoint.Checkpoint(filename)
+    done = checkpoint.start("datetime,phase,friendlydate,eclipse\n", args.restart)
 
-        url = f"https://astropixels.com/ephemeris/phasescat/phases{page}.html"
+    remaining = [page for page in pages if page not in done and page not in merged_pages]
+    urls = [page_fetcher.page_url(page, args.base_url) for page in remaining]
 
-        rows = get_page_content(url) 
+    if done:
+        print(f"Resuming after the page of the year: {done[-1]}")
+
+    # The pages are fetched concurrently but come back in year order
+    for page, text in zip(remaining, page_fetcher.fetch_pages_with_arguments(urls, args, REQUEST_HEADERS)):
+        print(f"\nCompiling date for the year: {page}")
+
+        rows = get_page_content(text) 
 
         write_to_csv(rows, filename)
-        
+        checkpoint.complete(page)
+
+    if merged_pages and not checkpoint.merged:
+        checkpoint.merge(existing, merged_pages)
+        print(f"Merged the years {merged_pages[0]} to {scrape_checkpoint.page_years(merged_pages[-1])[1]} of {args.merge}")
+
+    checkpoint.finish()
     print("Success")
 
 
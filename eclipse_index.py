@@ -0,0 +1,135 @@
+'''
+Index of the eclipses of a moon phase table and of the Hijri months they fall in.
+
+Every eclipse type is one bit of moon_phase_store.ECLIPSE_BITS, and the months of the calendars carry
+the bitmask of their eclipses (HijriMonth.eclipse). EclipseIndex keeps for every type the sorted times
+of its eclipses and the months holding one, so a query is a binary search instead of a rescan of the
+table.
+
+Example:
+	index = EclipseIndex(moon_phase_store.read_rows(filename), calendars["naive_metonic"])
+	index.next_eclipse(minutes_from_civil(2024, 10, 1), ECLIPSE_BITS["Total (Umbral) Lunar"])	# (minutes, bitmask)
+	index.months_with(SOLAR_ECLIPSES, 1400, 1500)		# Every month with a solar eclipse in 1400 - 1500
+
+Usage:
+	python eclipse_index.py [YYYY-MM-DD]
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import moon_phase_store
+from hijri_calendar_engine import compute_calendars
+from hijri_time import EPOCH_ORDINAL, MINUTES_PER_DAY, minutes_to_datetime
+from moon_phase_store import ECLIPSE_BITS, LUNAR_ECLIPSES, SOLAR_ECLIPSES, eclipse_names
+
+
+'''	--------- CONSTANTS ------------ '''
+
+ALL_ECLIPSES = SOLAR_ECLIPSES | LUNAR_ECLIPSES
+
+
+'''	--------- CLASSES ------------ '''
+class EclipseIndex:
+	"""
+		Times (minutes since the epoch) of the eclipses of each type, and the months with an eclipse of
+		each type, built in one pass over the rows of a moon phase table (see moon_phase_store.read_rows)
+		and over the HijriMonth records of a calendar
+	"""
+
+	def __init__(self, rows, months = ()):
+
+		self._times = {bit: array("q") for bit in ECLIPSE_BITS.values()}
+
+		for minutes, _, eclipse in rows:
+			if eclipse:
+				for bit, times in self._times.items():
+					if eclipse & bit:
+						times.append(minutes)
+
+		self.months = list(months)
+		self._month_indices = {bit: array("i") for bit in ECLIPSE_BITS.values()}	# Index into 'months'
+		self._month_years = {bit: array("i") for bit in ECLIPSE_BITS.values()}		# Hijri year of those months
+
+		for index, month in enumerate(self.months):
+			if month.eclipse:
+				for bit, indices in self._month_indices.items():
+					if month.eclipse & bit:
+						indices.append(index)
+						self._month_years[bit].append(month.year)
+
+	def _bits(self, mask):
+		return [bit for bit in self._times if mask & bit]
+
+	def next_eclipse(self, minutes, mask = ALL_ECLIPSES):
+		""" Returns the (minutes, bitmask) of the first eclipse of a type in the mask after the given time, None if there is none """
+		found = None
+
+		for bit in self._bits(mask):
+			times = self._times[bit]
+			index = bisect_right(times, minutes)
+
+			if index == len(times):
+				continue
+
+			if found is None or times[index] < found[0]:
+				found = (times[index], bit)
+			elif times[index] == found[0]:
+				found = (found[0], found[1] | bit)
+
+		return found
+
+	def eclipses_between(self, start, stop, mask = ALL_ECLIPSES):
+		""" Returns the (minutes, bitmask) of the eclipses of the types in the mask from start up to (not including) stop, in time order """
+		eclipses = {}
+
+		for bit in self._bits(mask):
+			times = self._times[bit]
+			for minutes in times[bisect_left(times, start): bisect_left(times, stop)]:
+				eclipses[minutes] = eclipses.get(minutes, 0) | bit
+
+		return sorted(eclipses.items())
+
+	def months_with(self, mask = ALL_ECLIPSES, start_year = None, end_year = None):
+		""" Returns the months with an eclipse of a type in the mask, of the Hijri years start_year to end_year (inclusive) """
+		indices = set()
+
+		for bit in self._bits(mask):
+			years = self._month_years[bit]
+			start = 0 if start_year is None else bisect_left(years, start_year)
+			stop = len(years) if end_year is None else bisect_right(years, end_year)
+			indices.update(self._month_indices[bit][start: stop])
+
+		return [self.months[index] for index in sorted(indices)]
+
+
+'''	----------- MAIN -------------- '''
+def main():
+
+	day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today()
+	minutes = (day.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY
+
+	dataset = moon_phase_store.DATASET
+	full_moons = moon_phase_store.load_full_moons(dataset["filename"], merge_eclipses = True)
+	months = compute_calendars(full_moons, dataset["end_year"], ["naive_metonic"])["naive_metonic"]
+
+	index = EclipseIndex(moon_phase_store.read_rows(dataset["filename"]), months)
+
+	eclipse = index.next_eclipse(minutes, ECLIPSE_BITS["Total (Umbral) Lunar"])
+	if eclipse:
+		print(f"Next total lunar eclipse after {day}: {minutes_to_datetime(eclipse[0])} UT")
+
+	eclipse = index.next_eclipse(minutes)
+	if eclipse:
+		print(f"Next eclipse after {day}: {', '.join(eclipse_names(eclipse[1]))}, {minutes_to_datetime(eclipse[0])} UT")
+
+	solar_months = index.months_with(SOLAR_ECLIPSES, 1400, 1500)
+	print(f"Months with a solar eclipse in the Hijri years 1400 to 1500 (naive metonic): {len(solar_months)}")
+
+
+if __name__ == "__main__":
+	main()
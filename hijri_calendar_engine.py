@@ -0,0 +1,460 @@
+'''
+One engine for all the Hijri calendar variants.
+
+The five calendar scripts differ in three choices, which are policies here:
+
+	Months		FixedMonths: fixed number of days per month (see HIJRI_MONTHS_DAYCOUNT)
+				ObservedMonths: each month runs from the day after a full moon to the next full moon
+	Kabs day	LimitKabs, DaysOffKabs, MetonicKabs: when Dhul Hijjah gets an extra day (fixed months only)
+	Leap month	BlueMoonLeap: Muharram at the start or end of the year depending on the blue moon
+				JanuaryLeap: the year ends with the month that ends in January
+				MetonicLeap: Muharram at the end of the years 3, 6, 8, 11, 14, 17 and 19 of every 19 years
+
+VARIANTS combines them into the five calendars. compute_calendars evaluates any subset of them in a
+single pass over one in-memory list of full moons and returns the months of each variant as a list
+of HijriMonth records.
+
+Example:
+	full_moons = moon_phase_store.load_full_moons(filename, merge_eclipses = True)
+	calendars = compute_calendars(full_moons, end_year = 2100, variants = ["aware", "naive_metonic"])
+	calendars["aware"][0]		# HijriMonth(gregorian_start=..., start=..., end=..., length=30, year=1, month=1, ...)
+
+iter_hijri_months yields the months of one variant for a range of Gregorian years one at a time. It
+only reads the moon phase table up to the end of the range and stops computing once it is passed:
+
+	for month in iter_hijri_months(2024, 2026, "naive_metonic"):
+		print(month.year, month.month, month.length, month.days_off)
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+import moon_phase_store
+import stage_profile
+from hijri_time import (MINUTES_PER_DAY, SECONDS_PER_DAY, civil_from_ordinal, mecca_midnight, mecca_ordinal,
+		minutes_from_civil)
+from muharram_index import YearIndex
+from stage_profile import argument_rows, profiled
+
+
+'''	--------- CONSTANTS ------------ '''
+
+HIJRI_MONTHS = {
+		0: "Muharram",
+		1: "Safar I", 2: "Safar II", 3: "Rabi I",
+		4: "Rabi II", 5: "Jumada I", 6: "Jumada II",
+		7: "Rajab", 8: "Sha'ban", 9: "Ramadan",
+		10: "Shawwal", 11: "Dhul Qadah", 12: "Dhul Hij.",
+		13: "Muharram"
+		}
+
+HIJRI_MONTHS_DAYCOUNT = {month_number: 30 if month_number % 2 == 1 else 29 for month_number in range(1, 12 + 1)}
+HIJRI_MONTHS_DAYCOUNT[13] = 30
+HIJRI_MONTHS_DAYCOUNT[0] = 30
+
+# This is the month that occassionally has an extra day, so Dhul Hijjah sometimes has 29 or 30 days
+KABS_MONTH = 12
+KABS_MONTHS = [8, 12]
+
+HIRJI_START_YEAR = 622 # AD
+
+HIRJI_START = minutes_from_civil(HIRJI_START_YEAR, 1, 1)	# Minutes since the epoch
+
+MUHARRAM_YEARS = [3, 6, 8, 11, 14, 17, 19]
+
+# See hijri_calendar_aware.py
+LIMIT_LUNAR_DAYS_OFF = 0.1
+
+SOLARYEAR_DAYS = 365.24219	# days
+
+"""
+	One month of a calendar. All days are ordinals in the timezone of Mecca.
+
+	gregorian_start, gregorian_end	Days of the full moons that start and end the month
+	start, end						First and last day of the Hijri month
+	length							Number of days in the Hijri month
+	year, month						Hijri year and month (0 and 13 are Muharram, look at 'HIJRI_MONTHS')
+	days_off						Deviation of the calendar from the full moon (as computed by the kabs policy)
+	leap_year						True if the Hijri year has a 13th month (Muharram)
+	eclipse							Bitmask of the eclipses during the month (see moon_phase_store.eclipse_text)
+"""
+HijriMonth = namedtuple("HijriMonth", ["gregorian_start", "gregorian_end", "start", "end", "length",
+		"year", "month", "days_off", "leap_year", "eclipse"])
+
+
+'''	--------- MONTH POLICIES ------------ '''
+class FixedMonths:
+	""" Months with a fixed number of days, chained one after the other from the first full moon """
+
+	def __init__(self, start_offset):
+		self.start_offset = start_offset	# Days between the first full moon and the start of the calendar
+
+	def is_before_hijra(self, minutes):
+		return minutes < HIRJI_START
+
+	def get_month(self, calendar, full_moon, next_full_moon):
+		""" Returns the start and end (minutes since the epoch) of the month """
+		if calendar.start is None:
+			calendar.start = full_moon + self.start_offset * MINUTES_PER_DAY
+
+		return calendar.start, calendar.start + calendar.daycount[calendar.month_count] * MINUTES_PER_DAY
+
+	def get_length(self, calendar, start, end):
+		return calendar.daycount[calendar.month_count]
+
+	def get_last_day(self, end):
+		""" The month ends when the next one starts """
+		return mecca_ordinal(end) - 1
+
+
+class ObservedMonths:
+	""" Months that start the day after a full moon and end on the day of the next full moon """
+
+	def is_before_hijra(self, minutes):
+		return minutes + MINUTES_PER_DAY < HIRJI_START
+
+	def get_month(self, calendar, full_moon, next_full_moon):
+		return full_moon + MINUTES_PER_DAY, next_full_moon
+
+	def get_length(self, calendar, start, end):
+		return round((end - start) / MINUTES_PER_DAY) + 1
+
+	def get_last_day(self, end):
+		return mecca_ordinal(end)
+
+
+'''	--------- KABS POLICIES ------------ '''
+class NoKabs:
+	""" Observed months follow the full moons, there is nothing to adjust """
+
+	def apply(self, calendar, start, end, full_moon, next_full_moon):
+		return end, 0
+
+
+class LimitKabs:
+	"""
+		hijri_calendar_aware.py: Dhul Hijjah gets an extra day if the start of the month is less than
+		'limit' days after the full moon and the year has no Muharram.
+	"""
+
+	def __init__(self, limit = LIMIT_LUNAR_DAYS_OFF):
+		self.limit = limit
+
+	def apply(self, calendar, start, end, full_moon, next_full_moon):
+		days_off = (start - full_moon) / MINUTES_PER_DAY
+
+		if days_off <= self.limit and calendar.month_count == KABS_MONTH and not calendar.leap_year:
+			end += MINUTES_PER_DAY
+			calendar.daycount[KABS_MONTH] = 30
+		else:
+			calendar.daycount[KABS_MONTH] = 29
+
+		if days_off > 3:
+			raise ValueError(f"Lunar days more than three whole days off: {days_off}")
+
+		return end, days_off
+
+
+class DaysOffKabs:
+	""" hijri_calendar_naive.py: Dhul Hijjah gets an extra day if its end is a whole day off the full moon """
+
+	def apply(self, calendar, start, end, full_moon, next_full_moon):
+		days_off = abs(next_full_moon - end) // MINUTES_PER_DAY
+
+		if days_off >= 1 and calendar.month_count == KABS_MONTH:
+			end += MINUTES_PER_DAY
+			calendar.daycount[KABS_MONTH] = 30
+		else:
+			calendar.daycount[KABS_MONTH] = 29
+
+		if days_off >= 2:
+			raise ValueError(f"Lunar days more than two whole days off: {days_off}")
+
+		return end, days_off
+
+
+class MetonicKabs:
+	"""
+		hijri_calendar_naive_metonic.py: Dhul Hijjah gets an extra day if the next full moon is a day or
+		more after the end of the month and the year has no Muharram.
+	"""
+
+	def apply(self, calendar, start, end, full_moon, next_full_moon):
+		days_off = (mecca_midnight(next_full_moon) - mecca_midnight(end)) // SECONDS_PER_DAY
+
+		if days_off >= 1 and not calendar.leap_year and calendar.month_count == KABS_MONTH:
+			end += MINUTES_PER_DAY
+			calendar.daycount[calendar.month_count] = 30
+		elif calendar.month_count in KABS_MONTHS:
+			calendar.daycount[calendar.month_count] = 29
+
+		if days_off > 3 or days_off < -3:
+			raise ValueError(f"Lunar days more than three whole days off: {days_off}")
+
+		return end, days_off
+
+
+'''	--------- LEAP MONTH POLICIES ------------ '''
+def is_january_end(start_day, end_day):
+	""" True if the month ends in January but did not start in it """
+	return civil_from_ordinal(end_day)[1] == 1 and civil_from_ordinal(start_day)[1] != 1
+
+
+class BlueMoonLeap:
+	"""
+		The 'aware' calendars: the year ends with the month ending in January. Muharram is added at the
+		start of the year if the blue moon is in its first 6 months, at the end if it is later.
+	"""
+	stop_on_start_year = False
+
+	def is_year_end(self, calendar, start_day, end_day):
+		return is_january_end(start_day, end_day) or calendar.month_count == 13
+
+	def start_year(self, calendar, index, upcoming_year):
+		position = calendar.year_index.get_muharram_position(index, upcoming_year)
+
+		calendar.leap_year = position != -1
+		calendar.month_count = -1 if position == 1 else 0
+
+
+class JanuaryLeap:
+	""" hijri_calendar_naive.py: the year ends with the month ending in January, Muharram is always at the end """
+	stop_on_start_year = True
+
+	def is_year_end(self, calendar, start_day, end_day):
+		return is_january_end(start_day, end_day) or calendar.month_count == 13
+
+	def start_year(self, calendar, index, upcoming_year):
+		calendar.leap_year = False
+		calendar.month_count = 0
+
+
+class MetonicLeap:
+	""" The 'metonic' calendars: Muharram ends the years 3, 6, 8, 11, 14, 17 and 19 of every 19 year cycle """
+	stop_on_start_year = False
+
+	def __init__(self, muharram_years = MUHARRAM_YEARS):
+		self.muharram_years = muharram_years
+
+	def is_year_end(self, calendar, start_day, end_day):
+		return (calendar.month_count == 12 and not calendar.leap_year) or calendar.month_count == 13
+
+	def start_year(self, calendar, index, upcoming_year):
+		calendar.leap_year = calendar.hijri_year % 19 in self.muharram_years
+		calendar.month_count = 0
+
+
+'''	--------- ENGINE ------------ '''
+class HijriCalendar:
+	""" Computes one calendar variant, one full moon at a time """
+
+	def __init__(self, months, kabs, leap, full_moons, year_index, end_year):
+		self.months = months
+		self.kabs = kabs
+		self.leap = leap
+		self.full_moons = full_moons
+		self.year_index = year_index
+		self.end_year = end_year
+
+		self.records = []
+		self.daycount = dict(HIJRI_MONTHS_DAYCOUNT)		# The kabs policies change the days of Dhul Hijjah
+		self.done = False
+
+		self.start = None		# Start of the next month (minutes since the epoch) for fixed months
+		self.hijri_year = 1
+		self.lunar_days = 0
+		self.month_count = 0
+		self.leap_year = False
+
+	@profiled("month step", trace_memory = False)
+	def step(self, index, full_moon_days):
+		""" Computes the month starting with the full moon at 'index' """
+		minutes = self.full_moons.minutes
+		full_moon, next_full_moon = minutes[index], minutes[index + 1]
+
+		# Hijri Calendar only exists at and after 622 AD
+		if self.months.is_before_hijra(full_moon):
+			return
+
+		# Exit if last year
+		if self.leap.stop_on_start_year and self.start is not None:
+			if civil_from_ordinal(mecca_ordinal(self.start))[0] == self.end_year:
+				self.done = True
+				return
+
+		self.month_count += 1
+
+		start, end = self.months.get_month(self, full_moon, next_full_moon)
+		end, days_off = self.kabs.apply(self, start, end, full_moon, next_full_moon)
+		length = self.months.get_length(self, start, end)
+
+		self.lunar_days += length
+
+		start_day = mecca_ordinal(start)
+		end_day = mecca_ordinal(end)
+
+		self.records.append(HijriMonth(full_moon_days[index], full_moon_days[index + 1], start_day,
+				self.months.get_last_day(end), length, self.hijri_year, self.month_count, days_off,
+				self.leap_year, self.full_moons.eclipses[index]))
+
+		# -------- END OF YEAR ---------
+		if self.leap.is_year_end(self, start_day, end_day):
+
+			# Check deviation of Hijri year (in days) from solar year
+			if abs(SOLARYEAR_DAYS - self.lunar_days) > 30:
+				raise ValueError(f"Hijri year {self.hijri_year} is off from the solar year by more than 30 days")
+
+			upcoming_year = civil_from_ordinal(end_day)[0]
+
+			# Exit if last year
+			if upcoming_year == self.end_year and not self.leap.stop_on_start_year:
+				self.done = True
+				return
+
+			self.hijri_year += 1
+			self.lunar_days = 0
+			self.leap.start_year(self, index, upcoming_year)
+
+		# Go the next month
+		self.start = end
+
+
+VARIANTS = {
+		"aware": lambda: (FixedMonths(start_offset = 1), LimitKabs(), BlueMoonLeap()),
+		"aware_simple": lambda: (ObservedMonths(), NoKabs(), BlueMoonLeap()),
+		"naive": lambda: (FixedMonths(start_offset = 0), DaysOffKabs(), JanuaryLeap()),
+		"naive_metonic": lambda: (FixedMonths(start_offset = 1), MetonicKabs(), MetonicLeap()),
+		"naive_simple_metonic": lambda: (ObservedMonths(), NoKabs(), MetonicLeap()),
+		}
+
+
+@profiled("compute", rows = argument_rows)
+def compute_calendars(full_moons, end_year, variants = VARIANTS):
+	"""
+		Computes the given calendar variants (names in VARIANTS) in one pass over the full moons.
+		Returns a dictionary of the months (a list of HijriMonth) of each variant.
+	"""
+	year_index = YearIndex(full_moons.minutes)
+
+	# Days of the full moons in Mecca, shared by every variant
+	full_moon_days = [mecca_ordinal(minutes) for minutes in full_moons.minutes]
+
+	calendars = {name: HijriCalendar(*VARIANTS[name](), full_moons, year_index, end_year) for name in variants}
+	active = list(calendars.values())
+
+	for index in range(len(full_moons) - 1):
+
+		for calendar in active:
+			calendar.step(index, full_moon_days)
+
+		if any(calendar.done for calendar in active):
+			active = [calendar for calendar in active if not calendar.done]
+
+		if not active:
+			break
+
+	return {name: calendar.records for name, calendar in calendars.items()}
+
+
+def iter_hijri_months(start_year, end_year, variant = "naive_metonic", datasets = moon_phase_store.DATASETS):
+	"""
+		Yields the months (HijriMonth) of a calendar variant whose first day (in Mecca) is in the
+		Gregorian years start_year to end_year (inclusive), in order. The calendar is computed from the
+		Hijra on, but only the full moons up to end_year (plus the look-ahead of the leap months) are
+		read and the computation stops at the first month after end_year.
+	"""
+	if variant not in VARIANTS:
+		raise ValueError(f"Unknown variant: {variant}")
+
+	# The calendar is computed from the Hijra, and the last months of the range need the full moons after it
+	try:
+		dataset = moon_phase_store.find_dataset(min(start_year, HIRJI_START_YEAR - 1), end_year + 1, datasets = datasets)
+	except FileNotFoundError:
+		dataset = moon_phase_store.find_dataset(min(start_year, HIRJI_START_YEAR - 1), end_year, datasets = datasets)
+	full_moons = moon_phase_store.load_full_moons(dataset["filename"], merge_eclipses = True,
+			start_year = max(HIRJI_START_YEAR - 1, dataset["start_year"]), end_year = end_year + 1)
+
+	full_moon_days = [mecca_ordinal(minutes) for minutes in full_moons.minutes]
+
+	# The calendar's own last year is after the range, the months are cut off here
+	calendar = HijriCalendar(*VARIANTS[variant](), full_moons, YearIndex(full_moons.minutes), end_year + 2)
+
+	for index in range(len(full_moons) - 1):
+		calendar.step(index, full_moon_days)
+
+		for month in calendar.records:
+			year = civil_from_ordinal(month.start)[0]
+
+			if year > end_year:
+				return
+			if year >= start_year:
+				yield month
+
+		calendar.records.clear()
+
+		if calendar.done:
+			return
+
+
+'''	----------- MAIN -------------- '''
+
+def main():
+	import calendar_writers		# Imports this module
+
+	start_year = 601
+	end_year = 2100
+
+	parser = argparse.ArgumentParser(description = "Computes the Hijri calendar variants in one pass")
+	parser.add_argument("variants", nargs = "*", metavar = "variant",
+			help = f"calendar variants to compute, any of {', '.join(VARIANTS)} (default: all)")
+	parser.add_argument("--format", choices = list(calendar_writers.WRITERS),
+			help = "write the months as text (the layout of the calendar scripts), csv, jsonl, binary or not at all (quiet)")
+	parser.add_argument("--output", metavar = "DIR",
+			help = "write one file per variant to this directory instead of the standard output")
+	parser.add_argument("--profile", metavar = "JSON",
+			help = "time the stages of the run and write the report to this file (see stage_profile.py)")
+	parser.add_argument("--profile-memory", action = "store_true",
+			help = "also trace the peak and retained memory of each stage (with --profile)")
+	args = parser.parse_args()
+
+	if args.profile_memory and not args.profile:
+		parser.error("--profile-memory needs --profile")
+
+	if args.profile:
+		stage_profile.enable(args.profile, memory = args.profile_memory)
+
+	for name in args.variants:
+		if name not in VARIANTS:
+			parser.error(f"unknown variant: {name}")
+
+	variants = args.variants or list(VARIANTS)
+
+	start = time.perf_counter()
+	full_moons = moon_phase_store.load_full_moons(moon_phase_store.dataset_filename(start_year, end_year), merge_eclipses = True)
+	calendars = compute_calendars(full_moons, end_year, variants)
+
+	if args.format is None:
+		for name, months in calendars.items():
+			print(f"{name}: {len(months)} months, {months[-1].year} Hijri years")
+	else:
+		if args.output:
+			os.makedirs(args.output, exist_ok = True)
+
+		for name, months in calendars.items():
+			filename = None
+			if args.output and args.format != "quiet":
+				filename = os.path.join(args.output, f"hijri_calendar_{name}.{calendar_writers.EXTENSIONS[args.format]}")
+			calendar_writers.write_months(months, args.format, name, filename)
+
+	# Keep the standard output clean for the data, the summary goes to the standard error
+	summary = sys.stderr if args.format and not args.output else sys.stdout
+	print(f"\n[SUCCESS] Computing {len(calendars)} Hijri Calendars in {time.perf_counter() - start:.3f} seconds\n", file = summary)
+
+
+if __name__ == "__main__":
+	main()
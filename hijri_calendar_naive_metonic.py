@@ -20,11 +20,13 @@ Moon Phases Table courtesy of Fred Espenak, www.Astropixels.com. Thank you Fred!
 
 
 '''	--------- PACKAGES ------------ '''
-import csv
 import math
-import pytz
 import sys
-from datetime import datetime, timedelta
+
+import moon_phase_store
+from hijri_time import (MINUTES_PER_DAY, SECONDS_PER_DAY, civil_from_ordinal, format_date,
+		mecca_midnight, mecca_ordinal, minutes_from_civil)
+from stage_profile import profiled, result_rows
 
 
 print("Packages imported successfully")
@@ -37,34 +39,11 @@ def get_number_of_days_in_month():
 		d[month_number] = 30 if month_number % 2 == 1 else 29
 	return d
 
-def is_fullmoon(row):
-	return row["phase"] == "Full Moon"
-
 
 '''	--------- CONSTANTS ------------ '''
 
 AVG_SYNODIC_MONTH = 29 + 12 / 24 + (44/60 / 24)	# 29 days, 12 hours, 44 minutes -> 29.530594 days
 
-DATEFORMAT = "%Y-%m-%d %H:%M:%S"
-
-FILES = [ 
-		{"start_year":  601, "end_year": 2100, "filename": "moon-phases-601-to-2100-UT.csv"},
-		{"start_year": 1900, "end_year": 2100, "filename": "moon-phases-1900-to-2100-UTC.csv"},
-		{"start_year": 1902, "end_year": 1998, "filename": "moon-phases-1902-to-1998-UTC.csv"},
-		{"start_year": 1980, "end_year": 2077, "filename": "moon-phases-1980-to-2077-UTC.csv"},
-		{"start_year": 2023, "end_year": 2024, "filename": "moon-phases-2023-to-2024-UTC.csv"},
-		{"start_year": 2024, "end_year": 2027, "filename": "moon-phases-2024-to-2027-UTC.csv"},
-		{"start_year": 2024, "end_year": 2040, "filename": "moon-phases-2024-to-2040-UTC.csv"},
-		{"start_year": 2024, "end_year": 2044, "filename": "moon-phases-2024-to-2044-UTC.csv"},
-		{"start_year": 2024, "end_year": 2055, "filename": "moon-phases-2024-to-2055-UTC.csv"},
-		]
-
-FILES_W_ECLIPSES = [
-		{"start_year":  601, "end_year": 700, "filename": "moon-phases-601-to-700-with-eclipses-UT.csv"},
-		{"start_year":  601, "end_year": 2100, "filename": "moon-phases-601-to-2100-with-eclipses-UT.csv"},
-		{"start_year":  601, "end_year": 4000, "filename": "moon-phases-601-to-4000-with-eclipses-UT.csv"},
-		]
-
 # This is the month that occassionally has an extra day, so Dhul Hijjah sometimes has 29 or 30 days
 KABS_MONTH = 12
 
@@ -79,6 +58,8 @@ HIJRI_MONTHS_DAYCOUNT = get_number_of_days_in_month()
 
 HIRJI_START_YEAR = 622 # AD
 
+HIRJI_START = minutes_from_civil(HIRJI_START_YEAR, 1, 1)	# Minutes since the epoch
+
 # Add the 13th month: Muharram
 HIJRI_MONTHS[13] = "Muharram"  		# Muharram is placed at end of year
 HIJRI_MONTHS_DAYCOUNT[13] = 30
@@ -88,8 +69,6 @@ HIJRI_MONTHS_DAYCOUNT[0] = 30
 MUHARRAM_YEARS = [3, 6, 8, 11, 14, 17, 19] #[1, 4, 6, 9, 12, 15, 17]
 KABS_MONTHS = [8, 12]
 
-MECCA_TIMEZONE = pytz.timezone('Asia/Riyadh')
-
 """
 ***************** PLEASE READ ************:
 This limit is somewhat arbitrary. Change this as you see fit. I recommend a value from 0 to 0.5.
@@ -107,71 +86,47 @@ SOLARYEAR_DAYS = 365.24219	# days
 
 '''	-------- FUNCTIONS ------------ '''
 def get_filename(start_year, end_year, contains_eclipse = False):
-	""" Returns filename of the csv file with the given starting and ending year """
-	
-	_files = FILES_W_ECLIPSES if contains_eclipse else FILES
-
-	for file in _files:
-		if file["start_year"] == start_year and file["end_year"] == end_year:
-			return file["filename"]
-
-	raise FileNotFoundError
+	""" Returns the filename of the smallest moon phase table that covers the given starting and ending year (see moon_phase_store.DATASETS) """
+	return moon_phase_store.dataset_filename(start_year, end_year, contains_eclipse)
 
+@profiled("parse", rows = result_rows)
 def parse_file(start_year, end_year):
-	""" Reads file, recording entries only when it's a full moon """
+	""" Reads the years of the file, recording the times of the full moons (see moon_phase_store.py) """
 
-	filename = "Moon phases CSV files/" + get_filename(start_year, end_year)
+	filename = get_filename(start_year, end_year)
 
-	entries = []
-	with open(filename, "r") as csvfile:
-		reader = csv.DictReader(csvfile)
-		entries = list(filter(is_fullmoon, reader))
+	full_moons = moon_phase_store.load_full_moons(filename, start_year = start_year, end_year = end_year)
 
 	print("\nFile parsed successfully\n")
-	return entries
+	return full_moons
 
+@profiled("parse", rows = result_rows)
 def parse_file_with_eclipses(start_year, end_year):
-	""" Reads file, recording entries only when it's a full moon """
-
-	filename = "Moon phases CSV files w eclipses/" + get_filename(start_year, end_year, True)
+	""" Reads the years of the file, recording the full moons with the eclipses of their month joined onto them """
 
-	entries = []
-	eclipses = []
+	filename = get_filename(start_year, end_year, True)
 
-	with open(filename, "r") as csvfile:
-		
-		reader = csv.DictReader(csvfile)
-		for row in reader:
-			
-			if row["phase"] != "Full Moon":
-				if eclipse := row["eclipse"]:
-					eclipses.append(eclipse)
-				continue
-
-			if eclipses != []:
-				if entries[-1]["eclipse"] == "":
-					entries[-1]["eclipse"] = ", ".join(eclipses)
-				else:
-					entries[-1]["eclipse"] = entries[-1]["eclipse"] + ", " + ", ".join(eclipses)
-				eclipses = []
-			
-			entries.append(row)
+	full_moons = moon_phase_store.load_full_moons(filename, merge_eclipses = True, start_year = start_year, end_year = end_year)
 
-			
 	print("\nFile parsed successfully\n")
-	return entries
+	return full_moons
 
 
 '''	----------- MAIN -------------- '''
 
+@profiled("main")
 def main():
 
 	'''	--------- VARIABLES ------------ '''
 	start_year = 601
 	end_year = 2100
-	# entries = parse_file(start_year, end_year)
-	entries = parse_file_with_eclipses(start_year, end_year)
-	entries_length = len(entries)
+	# full_moons = parse_file(start_year, end_year)
+	full_moons = parse_file_with_eclipses(start_year, end_year)
+	entries_length = len(full_moons)
+
+	# Times of the full moons in minutes since the epoch (UT), parsed once when reading the file
+	minutes = full_moons.minutes
+	eclipses = full_moons.eclipses
 
 	end_month = -1   		# Placeholder for the date of the end of the month
 	hirji_year = 1  		# Hirji year
@@ -179,50 +134,39 @@ def main():
 	month_count = 0 		# Which month we're in, look at 'HIJRI_MONTHS'
 	is_muharram = False
 
-
+	"""
+		All times below are minutes since the epoch (UT). They are only converted to days in 
+		the timezone of Mecca (as ordinals, see hijri_time.py) when printing or comparing days.
+	"""
 	for i in range(entries_length):
 
 		# If loop just started set start of month to Gregorian full moon date.
 		if end_month == -1:
-			start_month = datetime.strptime(entries[i]["datetime"], DATEFORMAT) + timedelta(days = 1)
+			start_month = minutes[i] + MINUTES_PER_DAY
 
 
 		# Get start and end of calendar month from Gregorian (True i.e. observed Full Moon)
-		gregorian_start_month = datetime.strptime(entries[i]["datetime"], DATEFORMAT)
-		gregorian_end_month = datetime.strptime(entries[i + 1]["datetime"], DATEFORMAT)
+		gregorian_start_month = minutes[i]
+		gregorian_end_month = minutes[i + 1]
 
 
 		# Hijri Calendar only exists at and after 622 AD
-		if gregorian_start_month.year < HIRJI_START_YEAR:
+		if gregorian_start_month < HIRJI_START:
 			continue;
 
 		# Add month count
 		month_count += 1
 		# Get end of calendar month
-		end_month = start_month + timedelta(days = HIJRI_MONTHS_DAYCOUNT[month_count])
-
-		
-		# -------------------------------- TIMEZONE ------------------------------------
-		# Assign UTC to naive datetime objects
-		start_month.replace(tzinfo=pytz.utc).astimezone(MECCA_TIMEZONE)
-		end_month.replace(tzinfo=pytz.utc).astimezone(MECCA_TIMEZONE)
-		gregorian_start_month.replace(tzinfo=pytz.utc).astimezone(MECCA_TIMEZONE)
-		gregorian_end_month.replace(tzinfo=pytz.utc)
-
-		# Convert to MECCA time zone
-		start_month = start_month.astimezone(MECCA_TIMEZONE)
-		end_month = end_month.astimezone(MECCA_TIMEZONE)
-		gregorian_start_month = gregorian_start_month.astimezone(MECCA_TIMEZONE)
-		gregorian_end_month = gregorian_end_month.astimezone(MECCA_TIMEZONE)
+		end_month = start_month + HIJRI_MONTHS_DAYCOUNT[month_count] * MINUTES_PER_DAY
 
 
-		days_off = (gregorian_end_month.replace(hour = 0, minute = 0, second = 0) -
-					end_month.replace(hour = 0, minute = 0, second = 0)).days
+		# Whole days between the (local) midnights of the true full moon and the end of the calendar month
+		days_off = (mecca_midnight(gregorian_end_month) - mecca_midnight(end_month)) // SECONDS_PER_DAY
 			
 
 		# Adjust length of the month accordingly if it's KABS month
 		if days_off >= 1 and not is_muharram and month_count == KABS_MONTH:
-			end_month += timedelta(days = 1)			# Add a day to the end of the month
+			end_month += MINUTES_PER_DAY				# Add a day to the end of the month
 			HIJRI_MONTHS_DAYCOUNT[month_count] = 30
 		elif month_count in KABS_MONTHS:
 			HIJRI_MONTHS_DAYCOUNT[month_count] = 29
@@ -230,7 +174,7 @@ def main():
 
 		if days_off > 3 or days_off < -3:
 			print("\nTERMINATING PROGRAM: LUNAR DAYS MORE THAN THREE WHOLE DAYS OFF")
-			print(f"\nLUNAR DAYS OFF: {lunar_days_off}")
+			print(f"\nLUNAR DAYS OFF: {days_off}")
 			print("\n[FAILURE] Computing Hijri Calendar\n")
 			sys.exit(1)
 
@@ -238,15 +182,20 @@ def main():
 		# Keep track of lunar days
 		lunar_days += HIJRI_MONTHS_DAYCOUNT[month_count]
 
+		# -------------------------------- TIMEZONE ------------------------------------
+		# Days in MECCA time zone
+		start_day = mecca_ordinal(start_month)
+		end_day = mecca_ordinal(end_month)
+
 		# Print Hijri Month
-		print(f"{HIJRI_MONTHS[month_count]} {HIJRI_MONTHS_DAYCOUNT[month_count]} \t\t\t\t\t\t\t\t\t\t\t\t\t\t{entries[i]['eclipse']}")
+		print(f"{HIJRI_MONTHS[month_count]} {HIJRI_MONTHS_DAYCOUNT[month_count]} \t\t\t\t\t\t\t\t\t\t\t\t\t\t{moon_phase_store.eclipse_text(eclipses[i])}")
 
 		# Print the Gregorian date
 		print(f"\tFull Moon Observed: "+ 
-			f"{gregorian_start_month.strftime('%B %d, %Y')} - {(gregorian_end_month - timedelta(days=1)).strftime('%B %d, %Y')}")
+			f"{format_date(mecca_ordinal(gregorian_start_month))} - {format_date(mecca_ordinal(gregorian_end_month) - 1)}")
 
 		# Print the Hirji Calendar in Gregorian
-		print(f"\tHijri (Gregorian) \t{start_month.strftime('%B %d, %Y')} - {(end_month - timedelta(days=1)).strftime('%B %d, %Y')}")
+		print(f"\tHijri (Gregorian) \t{format_date(start_day)} - {format_date(end_day - 1)}")
 
 		# Print Hijri calendar Natural
 		print(f"\tHijri (Natural): \t{HIJRI_MONTHS[month_count]} {1}, {hirji_year} - "
@@ -267,7 +216,7 @@ def main():
 
 				sys.exit(2)
 
-			upcoming_year = end_month.year
+			upcoming_year = civil_from_ordinal(end_day)[0]
 
 			# Exit if last year
 			if upcoming_year == end_year: 	
@@ -0,0 +1,185 @@
+'''
+NumPy engine for the observation-based (simple) Hijri calendars.
+
+Computes the same months as hijri_calendar_aware_simple.py and hijri_calendar_naive_simple_metonic.py,
+but on whole arrays instead of one full moon at a time, and returns them as a structured array
+(see MONTH_DTYPE) instead of printing them. Only the year boundaries of the 'aware' calendar are
+walked in Python since the position of Muharram depends on the previous year.
+
+All days are proleptic Gregorian ordinals in the timezone of Mecca (see hijri_time.py).
+
+Example:
+	full_moons = moon_phase_store.load_full_moons(filename)
+	months = compute_aware_simple(full_moons.minutes, end_year = 2100)
+	months[months["month"] == 9]			# Every Ramadan
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import numpy as np
+import time
+
+import moon_phase_store
+from hijri_time import EPOCH_ORDINAL, MINUTES_PER_DAY, mecca_ordinals, minutes_from_civil
+from muharram_index import YearIndex
+
+
+'''	--------- CONSTANTS ------------ '''
+
+HIRJI_START_YEAR = 622 # AD
+
+HIRJI_START = minutes_from_civil(HIRJI_START_YEAR, 1, 1)	# Minutes since the epoch
+
+MUHARRAM_YEARS = [3, 6, 8, 11, 14, 17, 19]
+
+SOLARYEAR_DAYS = 365.24
+
+MONTH_DTYPE = np.dtype([
+		("gregorian_start", "i4"),	# Day of the full moon that starts the month
+		("gregorian_end", "i4"),	# Day of the full moon that ends the month
+		("start", "i4"),			# First day of the Hijri month
+		("end", "i4"),				# Last day of the Hijri month
+		("length", "i1"),			# Number of days in the Hijri month
+		("year", "i4"),				# Hijri year
+		("month", "i1"),			# Hijri month, 0 and 13 are Muharram (look at 'HIJRI_MONTHS')
+		])
+
+
+'''	--------- UTILITIES ------------ '''
+def civil_years_months(ordinals):
+	""" Returns the Gregorian years and months (1 - 12) of an array of ordinals """
+	days = (np.asarray(ordinals) - EPOCH_ORDINAL).astype("datetime64[D]")
+	years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+	months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+	return years, months
+
+def get_observed_months(minutes):
+	"""
+		Returns the months between consecutive full moons that start at or after 622 AD, as a structured
+		array with the Hijri year and month still unset, and the index of the full moon starting each month.
+	"""
+	minutes = np.asarray(minutes, dtype = np.int64)
+
+	# A month starts the day after a full moon and ends at the next full moon
+	starts = minutes[:-1] + MINUTES_PER_DAY
+	ends = minutes[1:]
+
+	# Hijri Calendar only exists at and after 622 AD
+	indices = np.flatnonzero(starts >= HIRJI_START)
+	starts, ends = starts[indices], ends[indices]
+
+	months = np.zeros(len(indices), dtype = MONTH_DTYPE)
+	months["gregorian_start"] = mecca_ordinals(minutes[indices])
+	months["gregorian_end"] = mecca_ordinals(ends)
+	months["start"] = mecca_ordinals(starts)
+	months["end"] = months["gregorian_end"]
+	months["length"] = np.round((ends - starts) / MINUTES_PER_DAY) + 1
+
+	return months, indices
+
+
+'''	-------- FUNCTIONS ------------ '''
+def compute_aware_simple(minutes, end_year, year_index = None):
+	"""
+		Computes the observation-based calendar of hijri_calendar_aware_simple.py: a year ends with the
+		month that ends in January or with the 13th month, and Muharram is put at the start of the year
+		when the blue moon falls early in the year (see muharram_index.py).
+	"""
+	year_index = year_index or YearIndex(minutes)
+	months, indices = get_observed_months(minutes)
+
+	_, start_months = civil_years_months(months["start"])
+	end_years, end_months = civil_years_months(months["end"])
+
+	# Months that end in January (and did not start in it) end the Hijri year
+	year_ends = np.flatnonzero((end_months == 1) & (start_months != 1))
+
+	hijri_year = 1
+	first_month = 1		# Month number of the first month of the year, 0 if the year starts with Muharram
+	position = 0
+	stop = len(months)
+
+	while position < len(months):
+
+		# The year ends at the next month ending in January or at the 13th month, whichever comes first
+		next_year_end = np.searchsorted(year_ends, position)
+		next_year_end = year_ends[next_year_end] if next_year_end < len(year_ends) else stop
+		last = min(next_year_end, position + 13 - first_month, stop - 1)
+
+		months["year"][position: last + 1] = hijri_year
+		months["month"][position: last + 1] = np.arange(first_month, first_month + last - position + 1)
+
+		upcoming_year = end_years[last]
+
+		# Exit if last year
+		if upcoming_year == end_year:
+			stop = last + 1
+			break
+
+		hijri_year += 1
+		muharram_position = year_index.get_muharram_position(indices[last], upcoming_year)
+
+		# If Muharram is beginning of year shift all the months down
+		first_month = 0 if muharram_position == 1 else 1
+		position = last + 1
+
+	return months[:stop]
+
+
+def compute_naive_simple_metonic(minutes, end_year):
+	"""
+		Computes the observation-based calendar of hijri_calendar_naive_simple_metonic.py: the Hijri years
+		3, 6, 8, 11, 14, 17 and 19 of every 19 year cycle have a 13th month (Muharram) at the end.
+
+		Raises ValueError if a Hijri year is off from the solar year by more than 30 days.
+	"""
+	months, _ = get_observed_months(minutes)
+
+	# Number of months of each Hijri year, enough years to cover every month
+	hijri_years = np.arange(1, len(months) // 12 + 2)
+	months_per_year = np.where(np.isin(hijri_years % 19, MUHARRAM_YEARS), 13, 12)
+	year_starts = np.concatenate(([0], np.cumsum(months_per_year)))
+
+	months["year"] = np.repeat(hijri_years, months_per_year)[:len(months)]
+	months["month"] = np.arange(len(months)) - year_starts[months["year"] - 1] + 1
+
+	# Only complete years have an end of year
+	year_ends = year_starts[1:] - 1
+	year_ends = year_ends[year_ends < len(months)]
+
+	# Exit if last year
+	end_years, _ = civil_years_months(months["end"][year_ends])
+	last_years = np.flatnonzero(end_years == end_year)
+
+	if len(last_years):
+		year_ends = year_ends[:last_years[0] + 1]
+		months = months[:year_ends[-1] + 1]
+
+	# Check deviation of Hijri year (in days) from solar year
+	days = np.concatenate(([0], np.cumsum(months["length"], dtype = np.int64)))
+	lunar_days = days[year_ends + 1] - days[year_starts[:len(year_ends)]]
+	off = np.flatnonzero(np.abs(SOLARYEAR_DAYS - lunar_days) > 30)
+
+	if len(off):
+		raise ValueError(f"Hijri year {off[0] + 1} is off from the solar year by more than 30 days")
+
+	return months
+
+
+'''	----------- MAIN -------------- '''
+
+def main():
+
+	start_year = 601
+	end_year = 2100
+	full_moons = moon_phase_store.load_full_moons(moon_phase_store.dataset_filename(start_year, end_year))
+
+	for compute in (compute_aware_simple, compute_naive_simple_metonic):
+		start = time.perf_counter()
+		months = compute(full_moons.minutes, end_year)
+		print(f"{compute.__name__}: {len(months)} months, {months['year'][-1]} Hijri years "
+				+ f"in {time.perf_counter() - start:.3f} seconds")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,304 @@
+'''
+Persisted lookup table for app.py.
+
+Computing the calendar of the web app from the moon phase table takes seconds, and every worker used
+to pay for it on every start. build_lookup computes it once and saves it in a binary file next to the
+moon phase table (same name with a '.lookup.bin' extension), which the app memory-maps on start.
+
+The file starts with a 44 byte header (see HEADER) followed by these columns:
+
+	days				int32	Hijri date of every day from the first day of the calendar on (see pack_date)
+	month_starts		int32	First day (ordinal, Mecca) of every Hijri month
+	month_years			int32	Hijri year of every month
+	phase_days			int32	Day (ordinal, UT) of every moon phase
+	month_numbers		uint8	Hijri month, 0 and 13 are Muharram (look at 'HIJRI_MONTHS')
+	month_lengths		uint8	Number of days in the Hijri month, up to the start of the next month
+	phase_ids			uint8	Index into moon_phase_store.PHASES
+	phase_eclipses		uint8	Bitmask of moon_phase_store.ECLIPSE_TAGS (0 if there is no eclipse)
+
+The header records the size and modification time of the moon phase table it was built from, so
+open_lookup rebuilds the file when it is missing, was written by another VERSION, or is stale. When
+the file cannot be written, the table is kept in memory instead.
+
+Usage:
+	python hijri_lookup.py
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import moon_phase_store
+from hijri_calendar_engine import compute_calendars
+from hijri_time import utc_ordinal
+
+
+'''	--------- CONSTANTS ------------ '''
+
+MAGIC = b"HJRL"
+
+VERSION = 3
+
+# magic, version, flags, checksum of the columns, number of days, number of months, number of phases,
+# ordinal of the first day, size and modification time (ns) of the moon phase table
+HEADER = struct.Struct("<4sHHIIIIiQq")
+
+DATASET = moon_phase_store.DATASET["filename"]
+
+END_YEAR = moon_phase_store.DATASET["end_year"]
+
+# The calendar of the web app (see hijri_calendar_naive_metonic.py)
+CALENDAR = "naive_metonic"
+
+
+'''	--------- UTILITIES ------------ '''
+def lookup_filename(csv_filename = DATASET):
+	""" Returns the filename of the lookup table that belongs to the given CSV file """
+	return os.path.splitext(csv_filename)[0] + ".lookup.bin"
+
+def pack_date(year, month, day):
+	""" Packs a Hijri date into one integer: the year above 9 bits, the month (4 bits) and the day (5 bits) """
+	return year << 9 | month << 5 | day
+
+def unpack_date(packed):
+	""" Returns the (year, month, day) of a packed Hijri date """
+	return packed >> 9, packed >> 5 & 0xF, packed & 0x1F
+
+def source_stat(csv_filename):
+	""" Returns the size and modification time (ns) of the CSV file, (0, 0) if it does not exist """
+	try:
+		stat = os.stat(csv_filename)
+	except OSError:
+		return 0, 0
+	return stat.st_size, stat.st_mtime_ns
+
+
+'''	-------- FUNCTIONS ------------ '''
+def compute_lookup(csv_filename = DATASET, end_year = END_YEAR):
+	""" Computes the calendar and moon phases of the CSV file, returns the contents of the lookup table """
+
+	full_moons = moon_phase_store.load_full_moons(csv_filename)
+	months = compute_calendars(full_moons, end_year, [CALENDAR])[CALENDAR]
+
+	# A month runs up to the start of the next one, which can be a day past its length when the kabs
+	# month (Dhul Hijjah) got its extra day after its length was counted
+	lengths = [following.start - month.start for month, following in zip(months, months[1:])]
+	lengths += [months[-1].length] if months else []
+
+	base = months[0].start if months else 0
+	days = array("i", bytes(4 * (months[-1].start + lengths[-1] - base) if months else 0))
+
+	for month, length in zip(months, lengths):
+		for day in range(length):
+			days[month.start - base + day] = pack_date(month.year, month.month, day + 1)
+
+	if 0 in days:
+		day = date.fromordinal(base + days.index(0))
+		raise ValueError(f"The calendar has no Hijri date for {day}, the months are not consecutive")
+
+	month_starts = array("i", [month.start for month in months])
+	month_years = array("i", [month.year for month in months])
+	month_numbers = array("B", [month.month for month in months])
+	month_lengths = array("B", lengths)
+
+	phase_days = array("i")
+	phase_ids = array("B")
+	phase_eclipses = array("B")
+
+	for minutes, phase, eclipse in moon_phase_store.read_rows(csv_filename):
+		phase_days.append(utc_ordinal(minutes))
+		phase_ids.append(phase)
+		phase_eclipses.append(eclipse)
+
+	# Columns are always stored little-endian
+	columns = [days, month_starts, month_years, phase_days, month_numbers, month_lengths, phase_ids, phase_eclipses]
+
+	if sys.byteorder != "little":
+		for column in columns[:4]:
+			column.byteswap()
+
+	checksum = 0
+	for column in columns:
+		checksum = zlib.crc32(column, checksum)
+
+	size, mtime = source_stat(csv_filename)
+	header = HEADER.pack(MAGIC, VERSION, 0, checksum, len(days), len(months), len(phase_days), base, size, mtime)
+
+	return b"".join([header] + [column.tobytes() for column in columns])
+
+def save_lookup(data, filename):
+	""" Saves the contents of a lookup table, returns the filename """
+
+	# Written to a temporary file first, so workers starting at the same time never read half a file
+	temporary = f"{filename}.{os.getpid()}.tmp"
+
+	try:
+		with open(temporary, "wb") as file:
+			file.write(data)
+		os.replace(temporary, filename)
+	except OSError:
+		if os.path.exists(temporary):
+			os.remove(temporary)
+		raise
+
+	return filename
+
+def build_lookup(csv_filename = DATASET, filename = None, end_year = END_YEAR):
+	""" Computes the calendar and moon phases of the CSV file and saves them, returns the filename """
+	return save_lookup(compute_lookup(csv_filename, end_year), filename or lookup_filename(csv_filename))
+
+
+class HijriLookup:
+	"""
+		Memory-mapped lookup table (see build_lookup), or the contents of one (see compute_lookup). The
+		columns support indexing, slicing and len() like a list but are not copied into memory.
+	"""
+
+	def __init__(self, source):
+		if isinstance(source, str):
+			with open(source, "rb") as file:
+				self._mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+		else:
+			self._mmap = source
+
+		magic, version, self.flags, self.checksum, day_count, month_count, phase_count, self.base, \
+				self.source_size, self.source_mtime = HEADER.unpack_from(self._mmap)
+
+		if magic != MAGIC or version != VERSION:
+			if isinstance(self._mmap, mmap.mmap):
+				self._mmap.close()
+			raise ValueError(f"{source if isinstance(source, str) else 'The data'} is not a version {VERSION} Hijri lookup table")
+
+		view = memoryview(self._mmap)
+		offset = HEADER.size
+
+		def int32_column(count):
+			nonlocal offset
+			column = view[offset: offset + 4 * count].cast("i")
+			offset += 4 * count
+
+			if sys.byteorder != "little":
+				column = array("i", column)
+				column.byteswap()
+			return column
+
+		def uint8_column(count):
+			nonlocal offset
+			offset += count
+			return view[offset - count: offset]
+
+		self.days = int32_column(day_count)
+		self.month_starts = int32_column(month_count)
+		self.month_years = int32_column(month_count)
+		self.phase_days = int32_column(phase_count)
+		self.month_numbers = uint8_column(month_count)
+		self.month_lengths = uint8_column(month_count)
+		self.phase_ids = uint8_column(phase_count)
+		self.phase_eclipses = uint8_column(phase_count)
+
+	@property
+	def version(self):
+		""" Identifies the data of the table, changes whenever the table is rebuilt with other data """
+		return f"{VERSION}-{self.checksum:08x}"
+
+	def is_stale(self, csv_filename = DATASET):
+		""" True if the CSV file has changed since building the table (a missing CSV file is not) """
+		size, mtime = source_stat(csv_filename)
+		return size != 0 and (size, mtime) != (self.source_size, self.source_mtime)
+
+	def hijri_date(self, ordinal):
+		""" Returns the Hijri (year, month, day) of a day (ordinal), None if it is outside the calendar """
+		index = ordinal - self.base
+
+		if index < 0 or index >= len(self.days) or self.days[index] == 0:
+			return None
+
+		return unpack_date(self.days[index])
+
+	def gregorian_ordinal(self, year, month, day):
+		""" Returns the day (ordinal, Mecca) of a Hijri date, None if there is no such date in the calendar """
+		return self.gregorian_ordinals([(year, month, day)])[0]
+
+	def hijri_dates(self, ordinals):
+		""" Returns the hijri_date of each day (ordinal) in one pass over the table """
+		days, base, count = self.days, self.base, len(self.days)
+		return [unpack_date(days[ordinal - base]) if 0 <= ordinal - base < count and days[ordinal - base] else None
+				for ordinal in ordinals]
+
+	def gregorian_ordinals(self, dates):
+		""" Returns the gregorian_ordinal of each Hijri (year, month, day) in one pass over the table """
+		# The months of a year are consecutive, so a month is an offset from the first month of its year
+		first_months = {}
+
+		for year in {year for year, _, _ in dates}:
+			first = bisect_left(self.month_years, year)
+			if first < len(self.month_years) and self.month_years[first] == year:
+				first_months[year] = first
+
+		ordinals = []
+		for year, month, day in dates:
+			first = first_months.get(year)
+			index = None if first is None else first + month - self.month_numbers[first]
+
+			if index is None or index < first or index >= len(self.month_years) or self.month_years[index] != year \
+					or self.month_numbers[index] != month or not 1 <= day <= self.month_lengths[index]:
+				ordinals.append(None)
+			else:
+				ordinals.append(self.month_starts[index] + day - 1)
+
+		return ordinals
+
+	def moon_phases(self, ordinal):
+		""" Returns the (phase id, eclipse bitmask) of the moon phases on a day (ordinal, UT) """
+		start = bisect_left(self.phase_days, ordinal)
+		stop = bisect_right(self.phase_days, ordinal, start)
+		return list(zip(self.phase_ids[start: stop], self.phase_eclipses[start: stop]))
+
+
+def load_lookup(csv_filename = DATASET, filename = None):
+	"""
+		Builds the lookup table of the CSV file and returns its HijriLookup. When the file cannot be
+		written (a read-only data directory), the table is kept in memory until the next start.
+	"""
+	data = compute_lookup(csv_filename)
+
+	try:
+		return HijriLookup(save_lookup(data, filename or lookup_filename(csv_filename)))
+	except OSError:
+		return HijriLookup(data)
+
+def open_lookup(csv_filename = DATASET):
+	""" Returns the HijriLookup of the CSV file, building it first if it is missing, of another VERSION or stale """
+
+	filename = lookup_filename(csv_filename)
+
+	try:
+		lookup = HijriLookup(filename)
+
+		if not lookup.is_stale(csv_filename):
+			return lookup
+	except (OSError, ValueError, struct.error):
+		pass
+
+	return load_lookup(csv_filename, filename)
+
+
+'''	----------- MAIN -------------- '''
+def main():
+
+	csv_filename = sys.argv[1] if len(sys.argv) > 1 else DATASET
+	filename = build_lookup(csv_filename)
+	lookup = HijriLookup(filename)
+
+	print(f"Built {filename}: {len(lookup.month_starts)} months, {len(lookup.phase_days)} moon phases, version {lookup.version}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,147 @@
+'''
+Integer time axis shared by the Hijri calendar scripts.
+
+Times are kept as whole minutes since 1970-01-01 00:00 UT and days as proleptic Gregorian ordinals
+(the same numbers as date.toordinal()). Month lengths, offsets and deviations then become plain
+integer arithmetic and no datetime objects are created while computing the calendar.
+
+Dates of the Julian calendar (the moon phase tables before October 15, 1582) are converted through
+their Julian Day Number. The conversions to ordinals only use integer arithmetic, so they also run on
+NumPy arrays. They are checked against the convertdate package by test_hijri_time.py:
+
+	python -m pytest test_hijri_time.py
+
+The local dates are in the timezone of Mecca, Saudi Arabia (Asia/Riyadh). Its UTC offsets are a fixed
+table (see MECCA_TRANSITIONS), so the days are the same on every host whatever its local timezone or
+the installed tz database, and converting a time is one lookup in the table.
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+from bisect import bisect_right
+from datetime import datetime
+
+from stage_profile import profiled
+
+
+'''	--------- CONSTANTS ------------ '''
+
+MINUTES_PER_DAY = 24 * 60
+
+SECONDS_PER_DAY = 24 * 3600
+
+EPOCH = datetime(1970, 1, 1)
+
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Julian Day Number minus proleptic Gregorian ordinal (JDN 1721426 is January 1st, 1 AD)
+JDN_ORDINAL_OFFSET = 1721425
+
+MONTH_NAMES = [None, "January", "February", "March", "April", "May", "June",
+		"July", "August", "September", "October", "November", "December"]
+
+# UTC offsets of Mecca (seconds) and the times (seconds since the epoch) from which each is in effect:
+# local mean time until March 14, 1947 and +03:00 since (Asia/Riyadh in the tz database). The local
+# mean time (+03:06:52) is rounded to the minute like pytz, which the calendars were computed with.
+MECCA_TRANSITIONS = [float("-inf"), -719636812]
+
+MECCA_OFFSETS = [11220, 10800]
+
+
+'''	--------- UTILITIES ------------ '''
+def civil_from_ordinal(ordinal):
+	""" Returns the (year, month, day) of a proleptic Gregorian ordinal, same as date.fromordinal """
+
+	# Count days from March 1st of year 0 so the leap day is the last day of the year
+	days = ordinal + 305
+	era = days // 146097
+	day_of_era = days - era * 146097
+	year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+	day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+	month = (5 * day_of_year + 2) // 153
+	day = day_of_year - (153 * month + 2) // 5 + 1
+	month = month + 3 if month < 10 else month - 9
+
+	return year_of_era + era * 400 + (month <= 2), month, day
+
+def ordinal_from_civil(year, month, day):
+	""" Returns the proleptic Gregorian ordinal of a date, same as date(year, month, day).toordinal() (also on arrays) """
+
+	year = year - (month <= 2)
+	era = year // 400
+	year_of_era = year - era * 400
+	day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+	day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+
+	return era * 146097 + day_of_era - 305
+
+def julian_day_number(year, month, day):
+	"""
+		Returns the Julian Day Number of a date of the Julian calendar. Only integer arithmetic, so
+		the arguments may as well be NumPy arrays of years, months and days.
+	"""
+	# Count from March 1st of the year -4800 so the leap day is the last day of the year
+	a = (14 - month) // 12
+	year = year + 4800 - a
+	month = month + 12 * a - 3
+
+	return day + (153 * month + 2) // 5 + 365 * year + year // 4 - 32083
+
+def ordinal_from_julian(year, month, day):
+	""" Returns the proleptic Gregorian ordinal of a date of the Julian calendar (also on arrays, see julian_day_number) """
+	return julian_day_number(year, month, day) - JDN_ORDINAL_OFFSET
+
+@profiled("timestamps", trace_memory = False)
+def datetime_to_minutes(text):
+	""" Converts a 'YYYY-MM-DD HH:MM:SS' string (UT) to minutes since the epoch """
+	ordinal = ordinal_from_civil(int(text[:-15]), int(text[-14:-12]), int(text[-11:-9]))
+	return (ordinal - EPOCH_ORDINAL) * MINUTES_PER_DAY + int(text[-8:-6]) * 60 + int(text[-5:-3])
+
+def minutes_to_datetime(minutes):
+	""" Converts minutes since the epoch back to a 'YYYY-MM-DD HH:MM:SS' string (UT) """
+	year, month, day = civil_from_ordinal(minutes // MINUTES_PER_DAY + EPOCH_ORDINAL)
+	return f"{year:04d}-{month:02d}-{day:02d} {minutes % MINUTES_PER_DAY // 60:02d}:{minutes % 60:02d}:00"
+
+def minutes_from_civil(year, month, day, hour = 0, minute = 0):
+	""" Returns the minutes since the epoch of a UT date and time """
+	return (ordinal_from_civil(year, month, day) - EPOCH_ORDINAL) * MINUTES_PER_DAY + hour * 60 + minute
+
+def utc_ordinal(minutes):
+	""" Returns the ordinal of the UT day """
+	return minutes // MINUTES_PER_DAY + EPOCH_ORDINAL
+
+def format_date(ordinal):
+	""" Formats an ordinal like strftime('%B %d, %Y') """
+	year, month, day = civil_from_ordinal(ordinal)
+	return f"{MONTH_NAMES[month]} {day:02d}, {year}"
+
+
+'''	--------- TIMEZONE ------------ '''
+def mecca_offset(minutes):
+	""" Returns the UTC offset of Mecca (in seconds) at the given time """
+	return MECCA_OFFSETS[bisect_right(MECCA_TRANSITIONS, minutes * 60) - 1]
+
+@profiled("timezone", trace_memory = False)
+def mecca_ordinal(minutes):
+	""" Returns the ordinal of the local day in Mecca at the given time """
+	return (minutes * 60 + mecca_offset(minutes)) // SECONDS_PER_DAY + EPOCH_ORDINAL
+
+def mecca_ordinals(minutes):
+	""" Returns the ordinals of the local days in Mecca of a NumPy array of times (int64 minutes since the epoch) """
+	seconds = minutes * 60
+	offsets = MECCA_OFFSETS[0]
+
+	# Each transition adds the change of the offset to the times at or after it
+	for transition, before, after in zip(MECCA_TRANSITIONS[1:], MECCA_OFFSETS, MECCA_OFFSETS[1:]):
+		offsets = offsets + (seconds >= transition) * (after - before)
+
+	return (seconds + offsets) // SECONDS_PER_DAY + EPOCH_ORDINAL
+
+@profiled("timezone", trace_memory = False)
+def mecca_midnight(minutes):
+	"""
+		Returns the seconds since the epoch of the local midnight that starts the day in Mecca,
+		keeping the UTC offset of the given time (like datetime.replace(hour = 0, ...) would)
+	"""
+	offset = mecca_offset(minutes)
+	return ((minutes * 60 + offset) // SECONDS_PER_DAY) * SECONDS_PER_DAY - offset
@@ -0,0 +1,112 @@
+'''
+Memory budgets of the main stages on the canonical moon phase table.
+
+Runs each stage once with the allocations traced (see stage_profile.py), reports its peak memory
+(above the memory in use when it started) and the memory it retained, and exits with status 1 when
+a peak is over its budget in MEMORY_BUDGETS. Memory regressions are then caught like the speed
+regressions of benchmark.py. The memory-mapped tables (see moon_phase_store.py and hijri_lookup.py)
+are not Python allocations and are not counted.
+
+	load		moon_phase_store.load_full_moons of the whole table, with the eclipses
+	compute		hijri_calendar_engine.compute_calendars of all the variants
+	index		muharram_index.YearIndex of the full moons and eclipse_index.EclipseIndex of the table and
+				of the naive_metonic months
+	warm-up		Importing app.py (which opens the lookup table, and imports Flask) and one year of
+				/api/month through the Flask test client
+
+The lookup table of the app is built before the stages if it is missing or stale, so warm-up
+measures a normal start of the app.
+
+Usage:
+	python memory_budget.py [--output memory_profile.json]
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import argparse
+import contextlib
+import io
+import sys
+
+import hijri_lookup
+import moon_phase_store
+import stage_profile
+from eclipse_index import EclipseIndex
+from hijri_calendar_engine import compute_calendars
+from muharram_index import YearIndex
+
+
+'''	--------- CONSTANTS ------------ '''
+
+MIB = 1 << 20
+
+# Peak memory (bytes) of each stage on moon_phase_store.DATASET
+MEMORY_BUDGETS = {
+		"load": 2 * MIB,
+		"compute": 32 * MIB,
+		"index": 2 * MIB,
+		"warm-up": 24 * MIB,		# Mostly the modules of Flask
+		}
+
+# Months of /api/month requested by warm-up
+WARM_UP_YEAR = 2024
+
+
+'''	-------- STAGES ------------ '''
+def build_indexes(filename, full_moons, months):
+	""" The indexes of the full moons and of the eclipses """
+	return YearIndex(full_moons.minutes), EclipseIndex(moon_phase_store.read_rows(filename), months)
+
+def warm_up():
+	""" Starts the app and requests one year of months, returns the app module """
+	with contextlib.redirect_stdout(io.StringIO()):
+		import app
+
+	client = app.app.test_client()
+	for month in range(1, 12 + 1):
+		client.get(f"/api/month/{WARM_UP_YEAR}/{month}")
+
+	return app
+
+
+'''	----------- MAIN -------------- '''
+def main():
+
+	parser = argparse.ArgumentParser(description = "Checks the peak memory of the main stages against their budgets")
+	parser.add_argument("--output", default = stage_profile.PROFILE_FILENAME, help = "JSON file of the profile")
+	args = parser.parse_args()
+
+	dataset = moon_phase_store.DATASET
+	hijri_lookup.open_lookup()
+
+	stage_profile.enable(args.output, memory = True)
+
+	# Every result is kept, so that the memory retained by a stage is still in use during the next ones
+	full_moons = moon_phase_store.load_full_moons(dataset["filename"], merge_eclipses = True)
+	calendars = compute_calendars(full_moons, dataset["end_year"])
+	indexes = stage_profile.measure("index", build_indexes, dataset["filename"], full_moons, calendars["naive_metonic"])
+	app = stage_profile.measure("warm-up", warm_up)
+
+	stages = stage_profile.report()["stages"]
+	over = []
+
+	print(f"{'stage':<12}{'peak (MiB)':>14}{'retained (MiB)':>16}{'budget (MiB)':>14}")
+
+	for name, budget in MEMORY_BUDGETS.items():
+		stage = stages[name]
+		status = "OVER" if stage["peak_bytes"] > budget else "ok"
+
+		if status == "OVER":
+			over.append(name)
+
+		print(f"{name:<12}{stage['peak_bytes'] / MIB:>14.2f}{stage['retained_bytes'] / MIB:>16.2f}{budget / MIB:>14.2f}  {status}")
+
+	if over:
+		print(f"\n[FAILURE] Over the memory budget: {', '.join(over)}")
+		sys.exit(1)
+
+	print("\n[SUCCESS] Every stage is within its memory budget")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,448 @@
+'''
+Compact binary store for the moon phase CSV files.
+
+Reading the larger CSV files through csv.DictReader takes seconds on every run. This module converts
+a moon phase CSV file once into a columnar binary file which is saved next to it (same name with a
+'.bin' extension) and memory-maps it on load, which takes milliseconds.
+
+The binary file starts with a 16 byte header followed by three columns of equal length:
+
+	minutes		int64	Minutes since 1970-01-01 00:00 UT (proleptic Gregorian calendar)
+	phases		uint8	Index into PHASES
+	eclipses	uint8	Bitmask of ECLIPSE_TAGS (0 if there is no eclipse)
+
+load_full_moons (used by parse_file and parse_file_with_eclipses) reads the binary file whenever it
+exists and is not older than its CSV file, otherwise it reads the CSV file.
+
+Given a range of years, load_full_moons reads only those years (plus LOOKAHEAD_YEARS) instead of the
+whole table: a binary search on the 'minutes' column of the binary file, or a seek to the byte offset
+of the first year in the CSV file. The byte offsets of each year are kept in a small sidecar file next
+to the CSV file (same name with a '.years.json' extension), built the first time a range is read.
+
+The moon phase tables are listed in DATASETS. A range of years is resolved to the smallest table that
+is present and covers it (see find_dataset), and read as a view of that table. DATASET is the table
+shipped with the repository, which the web app uses.
+
+Usage:
+	python moon_phase_store.py ["Moon phases CSV files w eclipses/moon-phases-601-to-2100-with-eclipses-UT.csv"]
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+from hijri_time import datetime_to_minutes, minutes_from_civil
+from stage_profile import profiled, result_rows
+
+
+'''	--------- CONSTANTS ------------ '''
+
+MAGIC = b"MPHS"
+
+VERSION = 1
+
+# magic, version, flags, number of rows
+HEADER = struct.Struct("<4sHHQ")
+
+# Set in the header flags when the CSV file had an 'eclipse' column
+FLAG_HAS_ECLIPSE_COLUMN = 1
+
+# Phase ids of the csv files and of the table parsed by phase_table.py
+PHASES = ["New Moon", "First Quarter", "Full Moon", "Last Quarter"]
+
+FULL_MOON = PHASES.index("Full Moon")
+
+# The eclipse tags of the AstroPixels table, each tag is one bit
+ECLIPSE_TAGS = {
+	"T": "Total Solar",
+	"A": "Annular Solar",
+	"H": "Hybrid (Annular/Total) Solar",
+	"P": "Partial Solar",
+	"t": "Total (Umbral) Lunar",
+	"p": "Partial (Umbral) Lunar",
+	"n": "Penumbral Lunar"
+}
+
+ECLIPSE_BITS = {name: 1 << bit for bit, name in enumerate(ECLIPSE_TAGS.values())}
+
+SOLAR_ECLIPSES = sum(bit for name, bit in ECLIPSE_BITS.items() if name.endswith("Solar"))
+
+LUNAR_ECLIPSES = sum(bit for name, bit in ECLIPSE_BITS.items() if name.endswith("Lunar"))
+
+# The moon phase tables, a range of years is read from the smallest one that is present and covers it
+# (see find_dataset). The *-UTC tables are another source, their times can differ by a minute.
+DATASETS = [
+		{"start_year":  601, "end_year": 2100, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-601-to-2100-UT.csv"},
+		{"start_year": 1900, "end_year": 2100, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-1900-to-2100-UTC.csv"},
+		{"start_year": 1902, "end_year": 1998, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-1902-to-1998-UTC.csv"},
+		{"start_year": 1980, "end_year": 2077, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-1980-to-2077-UTC.csv"},
+		{"start_year": 2023, "end_year": 2024, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-2023-to-2024-UTC.csv"},
+		{"start_year": 2024, "end_year": 2027, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-2024-to-2027-UTC.csv"},
+		{"start_year": 2024, "end_year": 2040, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-2024-to-2040-UTC.csv"},
+		{"start_year": 2024, "end_year": 2044, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-2024-to-2044-UTC.csv"},
+		{"start_year": 2024, "end_year": 2055, "eclipses": False, "filename": "Moon phases CSV files/moon-phases-2024-to-2055-UTC.csv"},
+		{"start_year":  601, "end_year":  700, "eclipses": True,
+				"filename": "Moon phases CSV files w eclipses/moon-phases-601-to-700-with-eclipses-UT.csv"},
+		{"start_year":  601, "end_year": 2100, "eclipses": True,
+				"filename": "Moon phases CSV files w eclipses/moon-phases-601-to-2100-with-eclipses-UT.csv"},
+		{"start_year":  601, "end_year": 4000, "eclipses": True,		# Scraped with data_scraper_with_eclipses.py, then moved here
+				"filename": "Moon phases CSV files w eclipses/moon-phases-601-to-4000-with-eclipses-UT.csv"},
+		]
+
+# The table shipped with the repository: every moon phase from 601 to 2100 once, with its eclipse
+DATASET = DATASETS[10]
+
+YEAR_INDEX_VERSION = 1
+
+# Years read past the end year of a range, the calendars look up to 13 full moons past the
+# month they compute (see muharram_index.py)
+LOOKAHEAD_YEARS = 1
+
+
+'''	--------- UTILITIES ------------ '''
+def eclipse_names(mask):
+	""" Returns the eclipse names set in the bitmask, in the order of ECLIPSE_TAGS """
+	return [name for name, bit in ECLIPSE_BITS.items() if mask & bit]
+
+def eclipse_text(mask):
+	"""
+		Returns the eclipse names of the bitmask of a month joined by ", ". The lunar eclipse (at the
+		full moon that starts the month) comes before the solar eclipse (at the new moon).
+	"""
+	return ", ".join(eclipse_names(mask & LUNAR_ECLIPSES) + eclipse_names(mask & SOLAR_ECLIPSES))
+
+def store_filename(csv_filename):
+	""" Returns the filename of the binary store that belongs to the given CSV file """
+	return os.path.splitext(csv_filename)[0] + ".bin"
+
+def year_index_filename(csv_filename):
+	""" Returns the filename of the year index that belongs to the given CSV file """
+	return os.path.splitext(csv_filename)[0] + ".years.json"
+
+
+'''	-------- FUNCTIONS ------------ '''
+def convert_csv(csv_filename, store = None):
+	""" Converts a moon phase CSV file to the binary format, returns the filename of the store """
+
+	store = store or store_filename(csv_filename)
+
+	minutes = array("q")
+	phases = array("B")
+	eclipses = array("B")
+	flags = 0
+
+	with open(csv_filename, "r") as csvfile:
+		reader = csv.DictReader(csvfile)
+
+		if "eclipse" in reader.fieldnames:
+			flags |= FLAG_HAS_ECLIPSE_COLUMN
+
+		for row in reader:
+			minutes.append(datetime_to_minutes(row["datetime"]))
+			phases.append(PHASES.index(row["phase"]))
+			eclipses.append(ECLIPSE_BITS[row["eclipse"]] if row.get("eclipse") else 0)
+
+	# Columns are always stored little-endian
+	if sys.byteorder != "little":
+		minutes.byteswap()
+
+	# Written to a temporary file first, so a failed conversion never leaves a partial store behind
+	temporary = f"{store}.{os.getpid()}.tmp"
+
+	with open(temporary, "wb") as file:
+		file.write(HEADER.pack(MAGIC, VERSION, flags, len(minutes)))
+		minutes.tofile(file)
+		phases.tofile(file)
+		eclipses.tofile(file)
+
+	os.replace(temporary, store)
+	return store
+
+
+class MoonPhaseStore:
+	"""
+		Memory-mapped view of a binary moon phase file. The columns 'minutes', 'phases' and 'eclipses'
+		support indexing, slicing and len() like a list but are not copied into memory.
+	"""
+
+	def __init__(self, filename):
+		with open(filename, "rb") as file:
+			self._mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+		if len(self._mmap) < HEADER.size:
+			self._mmap.close()
+			raise ValueError(f"{filename} is truncated, it has no header")
+
+		magic, version, self.flags, count = HEADER.unpack_from(self._mmap)
+
+		if magic != MAGIC or version != VERSION:
+			self._mmap.close()
+			raise ValueError(f"{filename} is not a version {VERSION} moon phase store")
+
+		# 8 bytes of minutes, 1 of phase and 1 of eclipse per row
+		if len(self._mmap) != HEADER.size + 10 * count:
+			self._mmap.close()
+			raise ValueError(f"{filename} is truncated or corrupt, it does not hold {count} rows")
+
+		view = memoryview(self._mmap)
+		offset = HEADER.size
+
+		if sys.byteorder == "little":
+			self.minutes = view[offset: offset + 8 * count].cast("q")
+		else:
+			self.minutes = array("q", view[offset: offset + 8 * count])
+			self.minutes.byteswap()
+
+		offset += 8 * count
+		self.phases = view[offset: offset + count]
+		self.eclipses = view[offset + count: offset + 2 * count]
+
+	def __len__(self):
+		return len(self.phases)
+
+	@property
+	def has_eclipse_column(self):
+		return bool(self.flags & FLAG_HAS_ECLIPSE_COLUMN)
+
+
+def open_store(csv_filename):
+	"""
+		Returns the MoonPhaseStore belonging to the CSV file, or None if there is no binary file, it
+		is older than the CSV file (i.e. the CSV file has been changed since converting it) or it is
+		not a valid store (e.g. truncated), so the CSV file is read instead.
+	"""
+	store = store_filename(csv_filename)
+
+	if not os.path.exists(store):
+		return None
+
+	if os.path.exists(csv_filename) and os.path.getmtime(csv_filename) > os.path.getmtime(store):
+		return None
+
+	try:
+		return MoonPhaseStore(store)
+	except ValueError:
+		return None
+
+
+def build_year_index(csv_filename, index_filename = None):
+	"""
+		Scans the CSV file once and saves the byte offset of the first row of every year, plus the size
+		of the file as the last offset. Returns the index.
+	"""
+	offsets = []
+	first_year = None
+
+	with open(csv_filename, "rb") as file:
+		header = file.readline()
+		column = header.decode().rstrip().split(",").index("datetime")
+		offset = len(header)
+
+		for line in file:
+			# No quoted fields come before the datetime column ('YYYY-MM-DD HH:MM:SS')
+			year = int(line.split(b",", column + 1)[column][:-15])
+
+			if first_year is None:
+				first_year = year
+
+			while first_year + len(offsets) <= year:
+				offsets.append(offset)
+
+			offset += len(line)
+
+	offsets.append(offset)
+	index = {"version": YEAR_INDEX_VERSION, "size": offset, "first_year": first_year, "offsets": offsets}
+
+	try:
+		with open(index_filename or year_index_filename(csv_filename), "w") as file:
+			json.dump(index, file)
+	except OSError:
+		pass	# Read-only data directory, the index is rebuilt on the next run
+
+	return index
+
+
+def load_year_index(csv_filename):
+	""" Returns the year index of the CSV file, building it if it is missing or out of date """
+	index_filename = year_index_filename(csv_filename)
+
+	try:
+		with open(index_filename, "r") as file:
+			index = json.load(file)
+
+		if (index["version"] == YEAR_INDEX_VERSION and index["size"] == os.path.getsize(csv_filename)
+				and os.path.getmtime(index_filename) >= os.path.getmtime(csv_filename)):
+			return index
+	except (OSError, ValueError, KeyError):
+		pass
+
+	return build_year_index(csv_filename, index_filename)
+
+
+class FullMoons:
+	"""
+		The full moons of a moon phase table. 'minutes' holds their times (minutes since the epoch)
+		and 'eclipses' the eclipse bitmask of each full moon (0 if there is none, see eclipse_text).
+	"""
+
+	def __init__(self, minutes, eclipses):
+		self.minutes = minutes
+		self.eclipses = eclipses
+
+	def __len__(self):
+		return len(self.minutes)
+
+
+def read_rows(csv_filename, start_year = None, end_year = None):
+	"""
+		Returns an iterator over the (minutes, phase id, eclipse bitmask) of every row of a moon phase
+		table, from its binary store if there is a usable one and otherwise from the CSV file.
+
+		If start_year or end_year is given only the years from start_year to end_year (UT, inclusive)
+		are read.
+	"""
+	store = open_store(csv_filename)
+
+	if store is not None:
+		start, stop = 0, len(store)
+
+		if start_year is not None:
+			start = bisect_left(store.minutes, minutes_from_civil(start_year, 1, 1))
+		if end_year is not None:
+			stop = bisect_left(store.minutes, minutes_from_civil(end_year + 1, 1, 1))
+
+		return zip(store.minutes[start: stop], store.phases[start: stop], store.eclipses[start: stop])
+
+	if start_year is None and end_year is None:
+		return _read_csv_rows(csv_filename)
+
+	return _read_csv_range(csv_filename, start_year, end_year)
+
+
+def is_present(dataset):
+	""" True if the CSV file of the table or its binary store exists """
+	return os.path.exists(dataset["filename"]) or os.path.exists(store_filename(dataset["filename"]))
+
+
+def find_dataset(start_year, end_year, eclipses = True, datasets = DATASETS):
+	"""
+		Returns the smallest table of 'datasets' that is present and covers the years start_year to
+		end_year, one with an eclipse column if 'eclipses'. Raises FileNotFoundError if there is none.
+	"""
+	candidates = [dataset for dataset in datasets if dataset["start_year"] <= start_year and end_year <= dataset["end_year"]
+			and (dataset["eclipses"] or not eclipses) and is_present(dataset)]
+
+	if not candidates:
+		raise FileNotFoundError(f"No moon phase table{' with eclipses' if eclipses else ''} covers the years "
+				f"{start_year} to {end_year}, the largest is up to {last_year(eclipses, datasets)}")
+
+	return min(candidates, key = lambda dataset: dataset["end_year"] - dataset["start_year"])
+
+
+def dataset_filename(start_year, end_year, eclipses = True, datasets = DATASETS):
+	""" Returns the filename of the table that covers the years (see find_dataset) """
+	return find_dataset(start_year, end_year, eclipses, datasets)["filename"]
+
+
+def dataset_view(start_year, end_year, eclipses = True, datasets = DATASETS):
+	""" Returns the rows (see read_rows) of the years from start_year to end_year of the table that covers them """
+	return read_rows(dataset_filename(start_year, end_year, eclipses, datasets), start_year, end_year)
+
+
+def last_year(eclipses = True, datasets = DATASETS):
+	""" Returns the last year of the tables that are present (with an eclipse column if 'eclipses'), None if there is none """
+	years = [dataset["end_year"] for dataset in datasets if (dataset["eclipses"] or not eclipses) and is_present(dataset)]
+	return max(years, default = None)
+
+
+@profiled("load", rows = result_rows)
+def load_full_moons(csv_filename, merge_eclipses = False, start_year = None, end_year = None):
+	"""
+		Reads the full moons of a moon phase table (see read_rows). Each timestamp is parsed exactly once.
+
+		If merge_eclipses is True the eclipses of the other phases are joined onto the previous
+		full moon like parse_file_with_eclipses has always done.
+
+		If start_year or end_year is given only the years from start_year to end_year + LOOKAHEAD_YEARS
+		(UT, inclusive) are read.
+	"""
+	if end_year is not None:
+		end_year += LOOKAHEAD_YEARS
+
+	rows = read_rows(csv_filename, start_year, end_year)
+
+	minutes = []
+	eclipses = array("B")
+	pending = 0		# Eclipses of the other phases, joined onto the previous full moon at the next full moon
+
+	for minute, phase, eclipse in rows:
+
+		if phase != FULL_MOON:
+			if merge_eclipses:
+				pending |= eclipse
+			continue
+
+		if eclipses:
+			eclipses[-1] |= pending
+		pending = 0
+
+		minutes.append(minute)
+		eclipses.append(eclipse)
+
+	return FullMoons(minutes, eclipses)
+
+
+def _read_csv_rows(csv_filename):
+	""" Yields the (minutes, phase id, eclipse bitmask) of each row of a moon phase CSV file """
+
+	with open(csv_filename, "r") as csvfile:
+		yield from _parse_csv_rows(csvfile)
+
+
+def _read_csv_range(csv_filename, start_year, end_year):
+	""" Same as _read_csv_rows, but reads only the rows from start_year to end_year (either may be None) """
+
+	index = load_year_index(csv_filename)
+	offsets = index["offsets"]
+
+	def offset(year):
+		return offsets[min(max(year - index["first_year"], 0), len(offsets) - 1)]
+
+	start = offsets[0] if start_year is None else offset(start_year)
+	stop = offsets[-1] if end_year is None else offset(end_year + 1)
+
+	with open(csv_filename, "rb") as file:
+		header = file.readline().decode()
+		file.seek(start)
+		data = file.read(max(stop - start, 0)).decode()
+
+	yield from _parse_csv_rows(chain([header], data.splitlines(keepends = True)))
+
+
+def _parse_csv_rows(lines):
+	""" Yields the (minutes, phase id, eclipse bitmask) of each row of the lines of a moon phase CSV file """
+
+	for row in csv.DictReader(lines):
+		eclipse = row.get("eclipse")
+		yield datetime_to_minutes(row["datetime"]), PHASES.index(row["phase"]), ECLIPSE_BITS[eclipse] if eclipse else 0
+
+
+'''	----------- MAIN -------------- '''
+def main():
+
+	for csv_filename in sys.argv[1:] or [DATASET["filename"]]:
+		store = convert_csv(csv_filename)
+		build_year_index(csv_filename)
+		print(f"Converted {csv_filename} -> {store}, {year_index_filename(csv_filename)}")
+
+
+if __name__ == "__main__":
+	main()
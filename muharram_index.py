@@ -0,0 +1,104 @@
+'''
+Index of the full moons per Gregorian (UT) year.
+
+The 'aware' calendars put the 13th month (Muharram) at the start or at the end of a Hijri year
+depending on where the blue moon (two full moons in one Gregorian month) falls. Instead of rescanning
+the upcoming full moons at every new year, the full moons are indexed once by year: the number of
+full moons in each year and the months holding two full moons. The Muharram position then becomes
+a lookup.
+
+Example:
+	year_index = YearIndex(full_moons.minutes)
+	year_index.full_moon_count(1999)			# 13
+	year_index.blue_moon_months(1999)			# [1, 3]
+	year_index.muharram_position(2024)			# 1, 13 or -1
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+from array import array
+
+from hijri_time import civil_from_ordinal, utc_ordinal
+from stage_profile import profiled
+
+
+'''	--------- CLASSES ------------ '''
+class YearIndex:
+	""" Full moon counts and blue moons of each Gregorian (UT) year, built in one pass over the full moons """
+
+	def __init__(self, minutes):
+
+		self.years = array("h")			# UT year of each full moon
+		self.months = array("b")		# UT month of each full moon
+
+		for minute in minutes:
+			year, month, _ = civil_from_ordinal(utc_ordinal(minute))
+			self.years.append(year)
+			self.months.append(month)
+
+		self.first_year = self.years[0] if minutes else 0
+		self.last_year = self.years[-1] if minutes else -1
+
+		number_of_years = self.last_year - self.first_year + 1
+		self._first_index = [len(minutes)] * number_of_years		# Index of the first full moon of each year
+		self._counts = [0] * number_of_years
+		self._blue_moons = [()] * number_of_years					# Index of the first full moon of each pair
+
+		for index, year in enumerate(self.years):
+			offset = year - self.first_year
+
+			if self._counts[offset] == 0:
+				self._first_index[offset] = index
+			self._counts[offset] += 1
+
+			if index + 1 < len(self.years) and year == self.years[index + 1] and self.months[index] == self.months[index + 1]:
+				self._blue_moons[offset] += (index,)
+
+	def _offset(self, year):
+		return year - self.first_year if self.first_year <= year <= self.last_year else None
+
+	def full_moon_count(self, year):
+		""" Returns the number of full moons in the year (13 when there is a blue moon) """
+		offset = self._offset(year)
+		return 0 if offset is None else self._counts[offset]
+
+	def blue_moon_months(self, year):
+		""" Returns the months of the year in which two full moons fall """
+		offset = self._offset(year)
+		return [] if offset is None else [self.months[index] for index in self._blue_moons[offset]]
+
+	@profiled("leap month", trace_memory = False)
+	def get_muharram_position(self, index, year):
+		"""
+			Returns the position of Muharram for the Hijri year that starts in the given year, where 'index'
+			is the full moon starting the last month of the previous Hijri year. Counting the months from
+			that full moon, returns 1 if the blue moon occurs in the months 1 - 6 inclusive, 13 if in the
+			months 7 - 12 inclusive (or 13). Otherwise, if there is no Muharram month it will return -1.
+		"""
+		if index >= len(self.years):
+			return -1
+
+		for _year in range(self.years[index], year + 1):
+			offset = self._offset(_year)
+
+			for blue_moon in self._blue_moons[offset] if offset is not None else ():
+				if blue_moon < index:
+					continue
+
+				month_count = blue_moon - index + 1
+
+				if month_count > 13:
+					return -1
+				return 1 if month_count <= 6 else 13
+
+		return -1
+
+	def muharram_position(self, year):
+		""" Returns the position of Muharram (1, 13 or -1) in the Hijri year that starts in the given year """
+		offset = self._offset(year)
+
+		if offset is None or self._first_index[offset] == 0:
+			return -1
+
+		# The last month of the previous Hijri year starts with the last full moon of the previous year
+		return self.get_muharram_position(self._first_index[offset] - 1, year)
@@ -0,0 +1,194 @@
+"""
+    Fetches the pages of the moon phase tables (phases0601.html, phases0701.html, ...) for the
+    data scrapers.
+
+    The pages are fetched through one pooled requests.Session, several pages at a time (at most
+    'workers'), and handed back in the order they were asked for, so the scrapers still write
+    the csv file in year order.
+
+    The raw pages are kept in a cache on disk (see PageCache), since the tables practically never
+    change. A page in the cache is not fetched again, unless it is revalidated with the website
+    (--revalidate, a conditional request that only downloads the page if it has changed). With
+    --offline the csv files are rebuilt from the cache alone, without any network access.
+
+    To test without the website, point the base url at a local server holding saved pages:
+
+        python -m http.server 8000 --directory saved_pages
+        python data_scraper.py --base-url http://localhost:8000/
+"""
+
+
+"""------------------ PACKAGES -------------------"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import requests
+from requests.adapters import HTTPAdapter
+
+
+"""------------------ CONSTANTS -------------------"""
+
+BASE_URL = "https://astropixels.com/ephemeris/phasescat/"
+
+WORKERS = 8         # Pages fetched at the same time
+
+TIMEOUT = 30        # seconds
+
+RETRIES = 3         # Retries of failed connections
+
+CACHE_DIRECTORY = ".page_cache"
+
+# Headers of a response that let the page be revalidated with a conditional request
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+
+"""------------------ FUNCTIONS-------------------"""
+
+def write_atomically(filename, text):
+    """
+        Writes the file through a temporary file, so an interrupted run never leaves half a file
+    """
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, mode='w', newline='', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary, filename)
+
+
+class PageCache:
+    """
+        Raw pages on disk, keyed by url. Each page is saved as '<sha1 of the url>.html' next to
+        '<sha1 of the url>.json', which holds the url and the validators of the response.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, url, extension):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + extension)
+
+    def get(self, url):
+        """
+            Returns the text and the validators of the cached page, (None, {}) if it is not cached
+        """
+        try:
+            with open(self._filename(url, ".html"), encoding='utf-8') as file:
+                text = file.read()
+            with open(self._filename(url, ".json"), encoding='utf-8') as file:
+                validators = json.load(file)["validators"]
+        except (OSError, ValueError, KeyError):
+            return None, {}
+
+        return text, validators
+
+    def put(self, url, text, headers):
+        """
+            Saves the page with the validators found in the headers of its response
+        """
+        validators = {name: headers[name] for name in VALIDATORS if name in headers}
+
+        # The page is only found once its metadata is written
+        write_atomically(self._filename(url, ".html"), text)
+        write_atomically(self._filename(url, ".json"), json.dumps({"url": url, "validators": validators}))
+
+
+def page_url(page, base_url=BASE_URL):
+    """
+        Returns the url of the page of the moon phase table starting with the year 'page'
+        (a four digit string such as '0601')
+    """
+    return f"{base_url.rstrip('/')}/phases{page}.html"
+
+
+def create_session(workers=WORKERS, headers=None):
+    """
+        Returns a session that keeps up to 'workers' connections open, so consecutive pages
+        reuse them instead of connecting again
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=RETRIES)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    if headers:
+        session.headers.update(headers)
+
+    return session
+
+
+def fetch_page(session, url, cache=None, revalidate=False, offline=False):
+    """
+        Returns the text of the page, from the cache if it holds the page. Raises requests.HTTPError
+        if the page could not be fetched, and LookupError if it is not cached in offline mode.
+    """
+    text, validators = cache.get(url) if cache is not None else (None, {})
+
+    if offline:
+        if text is None:
+            raise LookupError(f"{url} is not in the page cache")
+        return text
+
+    if text is not None and not revalidate:
+        return text
+
+    # Only download the page again if it has changed
+    conditions = {VALIDATORS[name]: value for name, value in validators.items()} if text is not None else {}
+
+    response = session.get(url, headers=conditions, timeout=TIMEOUT)
+
+    if response.status_code == 304 and text is not None:
+        return text
+
+    response.raise_for_status()
+
+    if cache is not None:
+        cache.put(url, response.text, response.headers)
+
+    return response.text
+
+
+def fetch_pages(urls, workers=WORKERS, headers=None, cache=None, revalidate=False, offline=False):
+    """
+        Yields the text of each page in the order of 'urls', fetching up to 'workers' pages at
+        the same time. With one worker the pages are fetched one after another.
+        (see fetch_page for 'cache', 'revalidate' and 'offline')
+    """
+    with create_session(workers, headers) as session:
+
+        def fetch(url):
+            return fetch_page(session, url, cache, revalidate, offline)
+
+        if workers <= 1:
+            for url in urls:
+                yield fetch(url)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(fetch, urls)
+
+
+def add_arguments(parser):
+    """
+        Adds the options of fetching the pages to the argument parser of a scraper
+    """
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help="where the phasesNNNN.html pages are fetched from, e.g. a local server")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="pages fetched at the same time, 1 fetches them one after another")
+    parser.add_argument("--cache-dir", default=CACHE_DIRECTORY,
+                        help="directory of the raw pages that have been fetched before")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch the pages and do not save them")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="ask the website whether the cached pages have changed")
+    parser.add_argument("--offline", action="store_true",
+                        help="read the pages from the cache only, without any network access")
+
+
+def fetch_pages_with_arguments(urls, args, headers=None):
+    """
+        fetch_pages with the options of add_arguments
+    """
+    cache = None if args.no_cache else PageCache(args.cache_dir)
+    return fetch_pages(urls, args.workers, headers, cache, args.revalidate, args.offline)
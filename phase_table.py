@@ -0,0 +1,184 @@
+"""
+    Parses the 'Phases of the Moon' tables of AstroPixels for the data scrapers.
+
+    Each <pre> block of a page holds a decade of the table, one line per lunation:
+
+          Year      New Moon       First Quarter       Full Moon       Last Quarter
+
+          1501                                       Jan  4  14:02     Jan 12  15:48
+                 Jan 19  09:31     Jan 26  05:03     Feb  3  09:07     Feb 11  04:34
+                 Apr 17  16:00 P   Apr 25  10:57     May  3  05:12 t   May 10  00:50
+
+    The line of a year is aligned to the right (it starts in the middle of a lunation), every
+    other line starts with a new moon. parse_table matches a whole block with compiled regular
+    expressions and returns each moon phase as integers: minutes since 1970-01-01 00:00 UT
+    (see hijri_time.py), the index into PHASES and the bitmask of its eclipse (see
+    moon_phase_store.py). The text of the csv files is only formatted when writing them.
+
+    The dates of the table are in the Julian calendar before October 15, 1582.
+
+    iter_pre_blocks finds the <pre> blocks of a page by scanning its text, without building an
+    HTML tree, and hands their text straight to parse_table (see parse_page).
+
+    Measure the parser on saved pages:
+
+        python phase_table.py .page_cache/*.html
+"""
+
+
+"""------------------ PACKAGES -------------------"""
+import html
+import re
+import sys
+import time
+
+from hijri_time import (EPOCH_ORDINAL, MINUTES_PER_DAY, MONTH_NAMES, civil_from_ordinal,
+                        ordinal_from_civil, ordinal_from_julian)
+from moon_phase_store import ECLIPSE_BITS, ECLIPSE_TAGS, PHASES
+
+
+"""------------------ CONSTANTS -------------------"""
+
+MONTH_ABB = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+             "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+# The bit of each eclipse tag of the table
+TAG_BITS = {tag: ECLIPSE_BITS[name] for tag, name in ECLIPSE_TAGS.items()}
+
+# A moon phase of the table: 'Apr 17  16:00 P' (month, day, hour, minute, eclipse tag)
+PHASE_PATTERN = re.compile(r"(" + "|".join(MONTH_ABB) + r") +(\d{1,2}) +(\d{1,2}):(\d\d)(?: ([" + "".join(ECLIPSE_TAGS) + r"])\b)?")
+
+# The year at the start of a line
+YEAR_PATTERN = re.compile(r" *(\d+)(?!\d)")
+
+# The tags of a <pre> block of a page and any markup inside it
+PRE_START = re.compile(r"<pre\b[^>]*>", re.IGNORECASE)
+PRE_END = re.compile(r"</pre\s*>", re.IGNORECASE)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+# First day of the Gregorian calendar in the table
+GREGORIAN_START = (1582, 10, 15)
+
+
+"""------------------ FUNCTIONS-------------------"""
+
+def phase_minutes(year, month, day, hour, minute):
+    """
+        Returns the minutes since the epoch of a date and time (UT) of the table
+    """
+    if (year, month, day) < GREGORIAN_START:
+        ordinal = ordinal_from_julian(year, month, day)
+    else:
+        ordinal = ordinal_from_civil(year, month, day)
+
+    return (ordinal - EPOCH_ORDINAL) * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def parse_table(text, year=0):
+    """
+        Returns the (minutes, phase id, eclipse bitmask) of every moon phase in the text of a
+        <pre> block of the table, in time order. 'year' is the year of the lines before the first
+        year of the block.
+    """
+    rows = []
+
+    for line in text.splitlines():
+        phases = PHASE_PATTERN.findall(line)
+
+        # Headers and blank lines
+        if not phases:
+            continue
+
+        match = YEAR_PATTERN.match(line)
+
+        if match:
+            year = int(match.group(1))
+            phase = 4 - len(phases)     # The line of a year is aligned to the right
+        else:
+            phase = 0
+
+        for month, day, hour, minute, tag in phases:
+            rows.append((phase_minutes(year, MONTH_ABB[month], int(day), int(hour), int(minute)),
+                         phase, TAG_BITS[tag] if tag else 0))
+            phase += 1
+
+    return rows
+
+
+def iter_pre_blocks(text):
+    """
+        Yields the text of each <pre> block of a page, in order, the same text as BeautifulSoup's
+        element.text
+    """
+    position = 0
+
+    while True:
+        start = PRE_START.search(text, position)
+        if start is None:
+            return
+
+        end = PRE_END.search(text, start.end())
+        if end is None:
+            return
+
+        block = text[start.end(): end.start()]
+        position = end.end()
+
+        if "<" in block:
+            block = TAG_PATTERN.sub("", block)
+        if "&" in block:
+            block = html.unescape(block)
+
+        yield block
+
+
+def parse_page(text):
+    """
+        Returns the moon phases (see parse_table) of a page of the table. The first and last
+        <pre> blocks of a page are its title and footer.
+    """
+    rows = []
+    for block in list(iter_pre_blocks(text))[1:-1]:
+        rows += parse_table(block)
+
+    return rows
+
+
+def format_rows(rows, eclipses=True):
+    """
+        Yields the csv row (datetime, phase, friendlydate[, eclipse]) of each parsed moon phase
+    """
+    names = {bit: name for name, bit in ECLIPSE_BITS.items()}
+
+    for minutes, phase, eclipse in rows:
+        days, minute = divmod(minutes, MINUTES_PER_DAY)
+        year, month, day = civil_from_ordinal(days + EPOCH_ORDINAL)
+
+        row = (f"{year:04d}-{month:02d}-{day:02d} {minute // 60:02d}:{minute % 60:02d}:00", PHASES[phase],
+               f"{MONTH_NAMES[month]} {day:02d}, {year:04d}")
+
+        yield row + (names.get(eclipse),) if eclipses else row
+
+
+"""--------------------- MAIN --------------------"""
+def main():
+
+    if len(sys.argv) < 2:
+        print(f"Usage: python {sys.argv[0]} <page> [<page> ...]")
+        sys.exit(1)
+
+    texts = []
+    for filename in sys.argv[1:]:
+        with open(filename, encoding='utf-8') as file:
+            texts.append(file.read())
+
+    start = time.perf_counter()
+    count = sum(len(parse_page(text)) for text in texts)
+    seconds = time.perf_counter() - start
+
+    print(f"Parsed {len(texts)} pages, {count} moon phases in {seconds:.3f} s "
+          f"({len(texts) / seconds:.1f} pages/s, {count / seconds:.0f} moon phases/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+    Resumable scraping for the data scrapers.
+
+    After each page of the moon phase table is written to the csv file, the page and the size
+    of the csv file are saved in a checkpoint next to it ('<csv file>.checkpoint'). A run that
+    fails partway is resumed by running the scraper again: the csv file is cut back to the last
+    completed page and only the remaining pages are scraped. The checkpoint is removed once
+    every page has been written.
+
+    An existing dataset can be extended to a larger range of years with --merge: the pages it
+    already covers are not scraped again, its rows are merged in time order with the rows of the
+    pages that are scraped. The merged rows are written to '<csv file>.merged' and recorded in the
+    checkpoint before they replace the csv file, so a run that stops during the merge finishes it
+    when it is resumed instead of cutting the merged file back or merging the rows twice.
+
+        python data_scraper.py --start-year 601 --end-year 2500 --merge moon-phases-601-to-2100-UT.csv
+"""
+
+
+"""------------------ PACKAGES -------------------"""
+import heapq
+import json
+import os
+
+from hijri_time import datetime_to_minutes, ordinal_from_civil, ordinal_from_julian
+from page_fetcher import write_atomically
+
+
+"""------------------ CONSTANTS -------------------"""
+
+PAGE_YEARS = 100    # Years in one page of the table
+
+
+"""------------------ FUNCTIONS-------------------"""
+
+def row_year(line):
+    """
+        Returns the year of a line of a moon phase csv file (the datetime comes first) as the
+        pages of the table count it, in the Julian calendar before October 15, 1582
+    """
+    text = line.split(",", 1)[0]
+    year, month, day = int(text[:-15]), int(text[-14:-12]), int(text[-11:-9])
+
+    # The Julian calendar is at most 10 days behind in these years, only early January can differ
+    if month == 1 and day <= 10 and year <= 1582:
+        return year - (ordinal_from_civil(year, month, day) < ordinal_from_julian(year, 1, 1))
+
+    return year
+
+
+def row_minutes(line):
+    """
+        Returns the time of a line of a moon phase csv file in minutes since the epoch
+    """
+    return datetime_to_minutes(line.split(",", 1)[0])
+
+
+def page_years(page):
+    """
+        Returns the first and last year of a page ('0601' holds the years 601 to 700)
+    """
+    return int(page), int(page) + PAGE_YEARS - 1
+
+
+def read_dataset(filename):
+    """
+        Returns the header and the lines of the rows of a moon phase csv file
+    """
+    with open(filename, newline='', encoding='utf-8') as file:
+        return file.readline(), file.readlines()
+
+
+def covered_pages(pages, lines):
+    """
+        Returns the pages whose years are all within the years of the rows of a dataset
+    """
+    if not lines:
+        return []
+
+    first_year, last_year = row_year(lines[0]), row_year(lines[-1])
+    return [page for page in pages if first_year <= page_years(page)[0] and page_years(page)[1] <= last_year]
+
+
+def merge_dataset(filename, existing, pages, output=None):
+    """
+        Merges the rows of an existing dataset (see read_dataset) that belong to the pages into
+        the csv file, in time order (the rows of both are sorted already). The merged rows are
+        written to 'output' instead of the csv file if it is given.
+    """
+    header, lines = read_dataset(filename)
+    existing_header, existing_lines = existing
+
+    if header.strip() != existing_header.strip():
+        raise ValueError(f"The dataset merged into {filename} has other columns")
+
+    spans = [page_years(page) for page in pages]
+    existing_lines = [line for line in existing_lines if any(first <= row_year(line) <= last for first, last in spans)]
+
+    write_atomically(output or filename, header + "".join(heapq.merge(existing_lines, lines, key=row_minutes)))
+
+
+class Checkpoint:
+    """
+        The pages that have been written completely to a csv file, and the size of the file after
+        the last of them
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.checkpoint_filename = filename + ".checkpoint"
+        self.merged_filename = filename + ".merged"
+        self.pages = []
+        self.merged = False
+
+    def start(self, header, restart=False):
+        """
+            Resumes from the checkpoint if there is one (and not 'restart'), otherwise starts a new
+            csv file with the header. Returns the pages that have already been written.
+        """
+        if not restart and os.path.exists(self.checkpoint_filename) and os.path.exists(self.filename):
+            with open(self.checkpoint_filename, encoding='utf-8') as file:
+                checkpoint = json.load(file)
+
+            # Finish a merge that stopped before the merged rows replaced the csv file
+            self.merged = checkpoint.get("merged", False)
+            if self.merged and os.path.exists(self.merged_filename):
+                os.replace(self.merged_filename, self.filename)
+
+            # Drop the rows of a page that was being written when the run stopped
+            with open(self.filename, mode='r+b') as file:
+                file.truncate(checkpoint["size"])
+
+            self.pages = checkpoint["pages"]
+            return list(self.pages)
+
+        with open(self.filename, mode='w', newline='', encoding='utf-8') as file:
+            file.write(header)
+
+        self.pages = []
+        self.merged = False
+        self._save()
+        return []
+
+    def complete(self, page):
+        """
+            Records that the page has been written completely
+        """
+        self.pages.append(page)
+        self._save()
+
+    def merge(self, existing, pages):
+        """
+            Merges the rows of an existing dataset that belong to the pages into the csv file (see
+            merge_dataset), once every page has been written
+        """
+        merge_dataset(self.filename, existing, pages, self.merged_filename)
+
+        self.merged = True
+        self._save(os.path.getsize(self.merged_filename))
+        os.replace(self.merged_filename, self.filename)
+
+    def finish(self):
+        """
+            Removes the checkpoint once every page has been written
+        """
+        if os.path.exists(self.checkpoint_filename):
+            os.remove(self.checkpoint_filename)
+
+    def _save(self, size=None):
+        checkpoint = {"pages": self.pages, "size": os.path.getsize(self.filename) if size is None else size,
+                      "merged": self.merged}
+        write_atomically(self.checkpoint_filename, json.dumps(checkpoint))
@@ -0,0 +1,252 @@
+'''
+Optional timing of the stages of the Hijri calendar scripts.
+
+The stages are functions marked with the 'profiled' decorator: reading the moon phase table,
+parsing its timestamps, the timezone conversions, the leap month (Muharram) lookups, each step of the
+main loop of hijri_calendar_engine.py and writing the months. The calendar scripts compute and print
+their months in main, which is one stage. Every stage records its number of calls, wall time and,
+where it handles rows, the number of rows. The time of a stage includes the stages it calls.
+
+With HIJRI_PROFILE_MEMORY=1 (or --profile-memory) the Python allocations are traced with tracemalloc
+as well, and every stage also records its peak memory (above the memory in use when it started) and
+the memory it retained, except the stages called once per row (marked with trace_memory = False).
+Tracing slows the run down a lot, so the times are only meaningful without it.
+memory_budget.py checks the memory of the main stages against budgets.
+
+Profiling is switched on with the HIJRI_PROFILE environment variable, set to the JSON file of the
+report (or to 1 for PROFILE_FILENAME), or with the --profile option of hijri_calendar_engine.py.
+The report is written when the script exits:
+
+	HIJRI_PROFILE=profile.json python hijri_calendar_naive_metonic.py
+	python hijri_calendar_engine.py --format quiet --profile profile.json
+	python hijri_calendar_engine.py --format quiet --profile profile.json --profile-memory
+
+When profiling is off the decorator returns the function itself, so the stages cost nothing.
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+
+'''	--------- CONSTANTS ------------ '''
+
+ENVIRONMENT_VARIABLE = "HIJRI_PROFILE"
+
+MEMORY_VARIABLE = "HIJRI_PROFILE_MEMORY"
+
+PROFILE_FILENAME = "hijri_profile.json"
+
+VERSION = 2
+
+
+'''	--------- UTILITIES ------------ '''
+def result_rows(result, *args, **kwargs):
+	""" Rows of a stage: the length of its result """
+	return len(result)
+
+def argument_rows(result, rows, *args, **kwargs):
+	""" Rows of a stage: the length of its first argument """
+	return len(rows)
+
+
+'''	--------- CLASSES ------------ '''
+class Stage:
+	""" Calls, wall time (seconds), rows and, when tracing the memory, the peak and retained bytes of one stage """
+	__slots__ = ("calls", "seconds", "rows", "traced", "peak_bytes", "retained_bytes")
+
+	def __init__(self):
+		self.calls = 0
+		self.seconds = 0.0
+		self.rows = 0
+		self.traced = False
+		self.peak_bytes = 0			# Largest peak of a call, above the memory in use when it started
+		self.retained_bytes = 0		# Memory still in use after the calls, summed over them
+
+	def report(self):
+		record = {"calls": self.calls, "seconds": self.seconds,
+				"seconds_per_call": self.seconds / self.calls if self.calls else None}
+
+		if self.rows:
+			record["rows"] = self.rows
+			record["rows_per_second"] = self.rows / self.seconds if self.seconds else None
+
+		if self.traced:
+			record["peak_bytes"] = self.peak_bytes
+			record["retained_bytes"] = self.retained_bytes
+
+		return record
+
+
+'''	-------- FUNCTIONS ------------ '''
+_stages = {}
+
+_hooks = []			# (function, stage, rows, trace_memory) of the functions marked while profiling is off
+
+_report_filename = None
+
+_start = None
+
+_memory = False
+
+_frames = []		# [memory at the start, highest peak seen] of the stages being traced, innermost last
+
+
+def is_enabled():
+	return _report_filename is not None
+
+def _wrap(function, name, rows, trace_memory = True):
+	""" Returns the function timed as the stage 'name' """
+	stage = _stages.setdefault(name, Stage())
+	perf_counter = time.perf_counter
+
+	if _memory and trace_memory:
+		return _wrap_traced(function, stage, rows)
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		start = perf_counter()
+		try:
+			result = function(*args, **kwargs)
+		finally:
+			stage.seconds += perf_counter() - start
+			stage.calls += 1
+
+		if rows is not None:
+			stage.rows += rows(result, *args, **kwargs)
+		return result
+
+	return wrapper
+
+def _wrap_traced(function, stage, rows):
+	""" Returns the function timed as the stage, with the peak and retained memory of its calls """
+	perf_counter = time.perf_counter
+	get_traced_memory = tracemalloc.get_traced_memory
+	stage.traced = True
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		# reset_peak clears the peak of the stages around this one, so they keep the highest peak themselves
+		current, peak = get_traced_memory()
+		for outer in _frames:
+			outer[1] = max(outer[1], peak)
+		tracemalloc.reset_peak()
+
+		frame = [current, current]
+		_frames.append(frame)
+
+		start = perf_counter()
+		try:
+			result = function(*args, **kwargs)
+		finally:
+			stage.seconds += perf_counter() - start
+			stage.calls += 1
+
+			_frames.pop()
+			current, peak = get_traced_memory()
+			peak = max(peak, frame[1])
+
+			for outer in _frames:
+				outer[1] = max(outer[1], peak)
+
+			stage.peak_bytes = max(stage.peak_bytes, peak - frame[0])
+			stage.retained_bytes += current - frame[0]
+
+		if rows is not None:
+			stage.rows += rows(result, *args, **kwargs)
+		return result
+
+	return wrapper
+
+def profiled(name, rows = None, trace_memory = True):
+	"""
+		Marks a function (or method) as the stage 'name'. 'rows' counts the rows of a call, it is
+		called with the result and the arguments of the call (see result_rows and argument_rows).
+		Functions called once per row pass trace_memory = False, they are only timed.
+	"""
+	def decorate(function):
+		if is_enabled():
+			return _wrap(function, name, rows, trace_memory)
+
+		_hooks.append((function, name, rows, trace_memory))
+		return function
+
+	return decorate
+
+def _install(function, name, rows, trace_memory):
+	""" Replaces a function marked before profiling was switched on by its timed version, wherever it was imported """
+	wrapper = _wrap(function, name, rows, trace_memory)
+	owner_name, _, attribute = function.__qualname__.rpartition(".")
+
+	if owner_name:
+		owner = sys.modules[function.__module__]
+		for part in owner_name.split("."):
+			owner = getattr(owner, part)
+		setattr(owner, attribute, wrapper)
+		return
+
+	for module in list(sys.modules.values()):
+		if getattr(module, attribute, None) is function:
+			setattr(module, attribute, wrapper)
+
+def measure(name, function, *args, **kwargs):
+	""" Calls the function as the stage 'name' (for code that is not a marked function), returns its result """
+	if not is_enabled():
+		return function(*args, **kwargs)
+
+	return _wrap(function, name, None)(*args, **kwargs)
+
+def enable(filename = PROFILE_FILENAME, memory = False):
+	"""
+		Switches profiling on, the report is written to the JSON file when the script exits. With
+		'memory' the allocations are traced too (see tracemalloc).
+	"""
+	global _report_filename, _start, _memory
+
+	if is_enabled():
+		return
+
+	_report_filename = filename
+	_start = time.perf_counter()
+	_memory = memory
+
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+
+	for hook in _hooks:
+		_install(*hook)
+	_hooks.clear()
+
+	atexit.register(write_report)
+
+def report():
+	""" Returns the report of the stages, the slowest first """
+	stages = sorted(_stages.items(), key = lambda item: item[1].seconds, reverse = True)
+
+	return {
+		"version": VERSION,
+		"created": datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+		"argv": sys.argv,
+		"seconds": time.perf_counter() - _start,
+		"memory": _memory,
+		"stages": {name: stage.report() for name, stage in stages if stage.calls},
+		}
+
+def write_report():
+	with open(_report_filename, "w") as file:
+		json.dump(report(), file, indent = 1)
+
+	print(f"Profile written to {_report_filename}", file = sys.stderr)
+
+
+'''	----------- SWITCH -------------- '''
+if os.environ.get(ENVIRONMENT_VARIABLE):
+	enable(PROFILE_FILENAME if os.environ[ENVIRONMENT_VARIABLE] == "1" else os.environ[ENVIRONMENT_VARIABLE],
+			memory = bool(os.environ.get(MEMORY_VARIABLE)))
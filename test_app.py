@@ -0,0 +1,36 @@
+'''
+Tests of the JSON API of the web app (app.py), through the Flask test client.
+'''
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_convert_gregorian_date(client):
+    response = client.post('/api/convert', json=["2024-01-01"])
+    assert response.status_code == 200
+    assert response.get_json() == [{"gregorian": "2024-01-01", "hijri": {"year": 1409, "month": 1, "day": 5}}]
+
+@pytest.mark.parametrize('year', ['Infinity', '-Infinity', '1e400'])
+def test_convert_infinite_hijri_year(client, year):
+    body = f'[{{"hijri": {{"year": {year}, "month": 1, "day": 1}}}}, "2024-01-01"]'
+    response = client.post('/api/convert', data=body, content_type='application/json')
+    assert response.status_code == 200
+
+    results = response.get_json()
+    assert "error" in results[0]
+    assert results[1]["gregorian"] == "2024-01-01"
+
+def test_dates_before_the_year_1000_have_four_digit_years(client):
+    response = client.get('/api/month/700/1')
+    assert response.get_json()[0]["gregorian"] == "0700-01-01"
+
+    hijri = response.get_json()[0]["hijri"]
+    response = client.get(f'/api/hijri/{hijri["year"]}/{hijri["month"]}/{hijri["day"]}')
+    assert response.get_json()["gregorian"] == "0700-01-01"
@@ -0,0 +1,49 @@
+'''
+Tests of the lookup table of the web app (see hijri_lookup.py), built from the canonical moon phase table.
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import os
+from datetime import date
+
+import pytest
+
+import hijri_lookup
+
+
+'''	--------- FIXTURES ------------ '''
+@pytest.fixture(scope = "module")
+def lookup(tmp_path_factory):
+	root = os.path.dirname(os.path.abspath(__file__))
+	filename = str(tmp_path_factory.mktemp("lookup") / "lookup.bin")
+	return hijri_lookup.HijriLookup(hijri_lookup.build_lookup(os.path.join(root, hijri_lookup.DATASET), filename))
+
+
+'''	--------- TESTS ------------ '''
+def test_every_day_has_a_hijri_date(lookup):
+	assert 0 not in lookup.days
+
+def test_day_after_the_length_of_a_kabs_month(lookup):
+	# Dhul Hijjah 1397 has a length of 29 days but runs up to the day before 1398/1/1
+	assert lookup.hijri_date(date(2013, 1, 26).toordinal()) == (1397, 12, 29)
+	assert lookup.hijri_date(date(2013, 1, 27).toordinal()) == (1397, 12, 30)
+	assert lookup.hijri_date(date(2013, 1, 28).toordinal()) == (1398, 1, 1)
+
+def test_gregorian_ordinal_of_the_extra_day(lookup):
+	assert lookup.gregorian_ordinal(1397, 12, 30) == date(2013, 1, 27).toordinal()
+	assert lookup.gregorian_ordinal(1397, 12, 31) is None
+
+def test_hijri_dates_round_trip(lookup):
+	ordinals = range(lookup.base, lookup.base + len(lookup.days), 97)
+	dates = lookup.hijri_dates(ordinals)
+	assert lookup.gregorian_ordinals(dates) == list(ordinals)
+
+def test_lookup_kept_in_memory_when_it_cannot_be_saved(lookup, tmp_path):
+	filename = str(tmp_path / "missing directory" / "lookup.bin")
+	in_memory = hijri_lookup.load_lookup(hijri_lookup.DATASET, filename)
+
+	assert not os.path.exists(filename)
+	assert not os.listdir(tmp_path)
+	assert in_memory.version == lookup.version
+	assert in_memory.hijri_date(date(2013, 1, 27).toordinal()) == (1397, 12, 30)
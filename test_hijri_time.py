@@ -0,0 +1,44 @@
+'''
+Tests of the Julian calendar conversions of hijri_time.py against the convertdate package, for every
+day of the Julian years of the moon phase tables (601 to 1582).
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+from datetime import date
+
+import pytest
+
+from hijri_time import civil_from_ordinal, ordinal_from_civil, ordinal_from_julian
+
+julian = pytest.importorskip("convertdate.julian")
+np = pytest.importorskip("numpy")
+
+
+'''	--------- FIXTURES ------------ '''
+@pytest.fixture(scope = "module")
+def julian_dates():
+	""" Every day of the Julian years 601 to 1582 and its proleptic Gregorian ordinal according to convertdate """
+	dates = [(year, month, day) for year in range(601, 1583) for month in range(1, 13)
+			for day in range(1, julian.month_length(year, month) + 1)]
+
+	return dates, [date(*julian.to_gregorian(*julian_date)).toordinal() for julian_date in dates]
+
+
+'''	--------- TESTS ------------ '''
+def test_ordinal_from_julian(julian_dates):
+	dates, expected = julian_dates
+	assert [ordinal_from_julian(*julian_date) for julian_date in dates] == expected
+
+def test_ordinal_from_julian_on_arrays(julian_dates):
+	dates, expected = julian_dates
+	ordinals = ordinal_from_julian(*np.array(dates, dtype = np.int64).T)
+	assert ordinals.tolist() == expected
+
+def test_gregorian_reform():
+	# October 4, 1582 (Julian) was followed by October 15, 1582 (Gregorian)
+	assert ordinal_from_julian(1582, 10, 4) + 1 == ordinal_from_civil(1582, 10, 15)
+
+def test_civil_from_ordinal_round_trip(julian_dates):
+	_, ordinals = julian_dates
+	assert all(ordinal_from_civil(*civil_from_ordinal(ordinal)) == ordinal for ordinal in ordinals[::97])
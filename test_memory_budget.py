@@ -0,0 +1,33 @@
+'''
+Tests of the memory budgets of the main stages (see memory_budget.py). The stages run once in a
+separate interpreter, so that the modules and the allocations of the other tests are not counted.
+'''
+
+
+'''	--------- PACKAGES ------------ '''
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from memory_budget import MEMORY_BUDGETS
+
+
+'''	--------- FIXTURES ------------ '''
+@pytest.fixture(scope = "module")
+def stages(tmp_path_factory):
+	""" The report of each stage of one run of memory_budget.py """
+	root = os.path.dirname(os.path.abspath(__file__))
+	filename = tmp_path_factory.mktemp("memory") / "memory_profile.json"
+	subprocess.run([sys.executable, "memory_budget.py", "--output", str(filename)], cwd = root, capture_output = True)
+
+	with open(filename) as file:
+		return json.load(file)["stages"]
+
+
+'''	--------- TESTS ------------ '''
+@pytest.mark.parametrize("name", list(MEMORY_BUDGETS))
+def test_peak_memory_within_budget(stages, name):
+	assert stages[name]["peak_bytes"] <= MEMORY_BUDGETS[name]
@@ -0,0 +1,80 @@
+"""
+    Tests of resuming the scrapers from their checkpoint (see scrape_checkpoint.py), with a crash
+    during the merge of an existing dataset.
+"""
+
+
+"""------------------ PACKAGES -------------------"""
+import os
+
+import pytest
+
+import scrape_checkpoint
+
+
+"""------------------ CONSTANTS -------------------"""
+
+HEADER = "datetime,phase,friendlydate\n"
+
+EXISTING_ROWS = ["0601-01-12 05:01:00,Full Moon,x\n", "0700-12-20 10:00:00,Full Moon,x\n"]
+
+SCRAPED_ROWS = ["0701-01-04 03:00:00,Full Moon,x\n", "0800-12-21 01:00:00,Full Moon,x\n"]
+
+
+"""------------------ TESTS -------------------"""
+
+def scrape(filename):
+    """
+        Writes the page '0701' and merges the page '0601' of the existing dataset, like the
+        scrapers do, resuming from the checkpoint
+    """
+    existing = HEADER, EXISTING_ROWS
+    checkpoint = scrape_checkpoint.Checkpoint(filename)
+
+    if "0701" not in checkpoint.start(HEADER):
+        with open(filename, mode='a', newline='', encoding='utf-8') as file:
+            file.writelines(SCRAPED_ROWS)
+        checkpoint.complete("0701")
+
+    if not checkpoint.merged:
+        checkpoint.merge(existing, ["0601"])
+
+    checkpoint.finish()
+
+
+def read_rows(filename):
+    with open(filename, newline='', encoding='utf-8') as file:
+        return file.readlines()
+
+
+def test_merge(tmp_path):
+    filename = str(tmp_path / "moon-phases.csv")
+    scrape(filename)
+
+    assert read_rows(filename) == [HEADER] + EXISTING_ROWS + SCRAPED_ROWS
+    assert not os.path.exists(filename + ".checkpoint")
+
+
+@pytest.mark.parametrize("crash", ["before replacing", "after replacing"])
+def test_resume_after_a_crash_during_the_merge(tmp_path, monkeypatch, crash):
+    filename = str(tmp_path / "moon-phases.csv")
+    replace = os.replace
+
+    def crashing_replace(source, destination):
+        if destination == filename:
+            if crash == "after replacing":
+                replace(source, destination)
+            raise KeyboardInterrupt
+
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    with pytest.raises(KeyboardInterrupt):
+        scrape(filename)
+
+    monkeypatch.setattr(os, "replace", replace)
+    scrape(filename)
+
+    assert read_rows(filename) == [HEADER] + EXISTING_ROWS + SCRAPED_ROWS
+    assert not os.path.exists(filename + ".checkpoint")
+    assert not os.path.exists(filename + ".merged")